@@ -0,0 +1,150 @@
+import argparse
+import io
+import json
+import random
+from datetime import datetime, timedelta
+from faker import Faker
+from ingestion import build_failure_record
+
+REPOS = [
+    "facebook/react", "microsoft/vscode", "kubernetes/kubernetes", "nodejs/node", "google/tensorflow",
+    "angular/angular", "django/django", "rails/rails", "vuejs/vue", "docker/docker", "apache/kafka",
+    "elastic/elasticsearch", "spring-projects/spring-boot", "redis/redis", "mongodb/mongo", "mysql/mysql-server",
+    "postgresql/postgresql", "laravel/laravel", "symfony/symfony", "apple/swift", "uber/react-native",
+    "netflix/zuul", "airbnb/lottie-react-native", "spotify/docker-gc", "dropbox/zxcvbn", "github/gitignore"
+]
+WORKFLOWS = [
+    "CI", "Build", "Test", "Integration Tests", "E2E Tests", "Docker Build", "Code Quality", "Security Scan",
+    "Performance Tests", "Deploy", "Release", "Kubernetes Deploy", "AWS Deploy", "Azure Deploy"
+]
+ERROR_TEMPLATES = [
+    "npm ERR! code ELIFECYCLE in {package}@{version}",
+    "npm ERR! 404 Not Found - GET https://registry.npmjs.org/{package}",
+    "FAIL {path} ({n} failed, {m} passed)",
+    "Tests failed: {n} of {m} in {module}",
+    "AssertionError: expected {n} to equal {m} in {func}",
+    "TypeError: Cannot read property '{word}' of undefined at {func} ({path}:{n}:{m})",
+    "ModuleNotFoundError: No module named '{module}' (exception during import)",
+    "Traceback (most recent call last): File \"{path}\", line {n}, in {func}",
+    "error: linker command failed with exit code {n}",
+    "ERROR: failed to solve: process \"/bin/sh -c {word} install\" did not complete successfully: exit code {n}",
+    "Build failed in {m} seconds: {module} did not compile",
+    "FATAL: password authentication failed for user \"{word}\"",
+    "error: connect ECONNREFUSED {ip}:{port}",
+    "Error from server (Forbidden): pods is forbidden: User \"{word}\" cannot list resource",
+    "error: deployment \"{word}-{module}\" exceeded its progress deadline",
+    "An error occurred (AccessDenied) when calling the {func} operation",
+    "Error: ResourceNotFound for resource group '{word}-{n}'",
+    "java.lang.NullPointerException at {module}.{func}({file}:{n})",
+    "RuntimeError: CUDA out of memory. Tried to allocate {n} MiB",
+    "fatal: unable to access 'https://github.com/{repo}.git/': Could not resolve host",
+    "Security scan failed: {n} high severity vulnerabilities in {package}@{version}",
+    "error TS{n}: Property '{word}' does not exist on type '{func}'",
+    "Process completed with exit code {n}. Step '{word}' failed",
+    "ERROR: Job failed: execution took longer than {n}m{m}s seconds",
+    "Exception in thread \"main\" java.lang.OutOfMemoryError: Java heap space"
+]
+NOISE_TEMPLATES = [
+    "Installing dependencies...",
+    "Resolving packages for {package}@{version}",
+    "Compiling {module} ({n} files)",
+    "Running {func} in {path}",
+    "Downloading {package} from cache",
+    "Step {n}/{m}: {word}",
+    "  at {func} ({path}:{n}:{m})",
+    "Uploading artifact {word}-{n}.tar.gz",
+    "Test suite {module}: {n} passed",
+    "Cleaning up..."
+]
+REPO_WEIGHTS = [1 / (rank + 1) ** 1.1 for rank in range(len(REPOS))]
+WORKFLOW_WEIGHTS = [1 / (rank + 1) ** 0.8 for rank in range(len(WORKFLOWS))]
+ERROR_WEIGHTS = [1 / (rank + 1) ** 0.9 for rank in range(len(ERROR_TEMPLATES))]
+START = datetime(2024, 1, 1)
+SPAN_DAYS = 365
+RUN_ID_BASE = 10_000_000
+
+def vocabulary(seed, size=200):
+    fake = Faker()
+    fake.seed_instance(seed)
+    return {
+        "word": [fake.word() for _ in range(size)],
+        "func": [f"{fake.word()}_{fake.word()}" for _ in range(size)],
+        "module": [f"{fake.word()}.{fake.word()}" for _ in range(size)],
+        "package": [fake.slug() for _ in range(size)],
+        "path": [fake.file_path(depth=3, extension=["js", "py", "ts", "java"]) for _ in range(size)],
+        "file": [fake.file_name(extension="java") for _ in range(size)],
+        "ip": [fake.ipv4_private() for _ in range(size)]
+    }
+
+def fill(template, rng, words, repo):
+    return template.format(
+        word=rng.choice(words["word"]),
+        func=rng.choice(words["func"]),
+        module=rng.choice(words["module"]),
+        package=rng.choice(words["package"]),
+        path=rng.choice(words["path"]),
+        file=rng.choice(words["file"]),
+        ip=rng.choice(words["ip"]),
+        port=rng.choice([80, 443, 5432, 6379, 8080, 9200]),
+        version=f"{rng.randint(0, 9)}.{rng.randint(0, 30)}.{rng.randint(0, 20)}",
+        repo=repo,
+        n=rng.randint(1, 500),
+        m=rng.randint(1, 500)
+    )
+
+def synthetic_log(rng, words, repo, workflow):
+    lines = [f"Starting {workflow} workflow for {repo}"]
+    errors = rng.choices(range(len(ERROR_TEMPLATES)), weights=ERROR_WEIGHTS, k=rng.choices([1, 2, 3], weights=[6, 3, 1])[0])
+    for template in errors:
+        lines += [fill(rng.choice(NOISE_TEMPLATES), rng, words, repo) for _ in range(rng.randint(5, 40))]
+        lines.append(fill(ERROR_TEMPLATES[template], rng, words, repo))
+    lines.append(f"Workflow {workflow} completed with errors")
+    return "\n".join(lines)
+
+def generate_failures(runs, seed=7):
+    rng = random.Random(seed)
+    words = vocabulary(seed)
+    for i in range(runs):
+        repo = rng.choices(REPOS, weights=REPO_WEIGHTS)[0]
+        workflow = rng.choices(WORKFLOWS, weights=WORKFLOW_WEIGHTS)[0]
+        run_data = {"status": "completed", "conclusion": "failure", "name": workflow, "head_sha": f"{rng.getrandbits(160):040x}"}
+        log = synthetic_log(rng, words, repo, workflow)
+        record = build_failure_record(repo, RUN_ID_BASE + i, run_data, io.BytesIO(log.encode("utf-8")))
+        record["timestamp"] = (START + timedelta(seconds=rng.uniform(0, SPAN_DAYS * 86400))).isoformat()
+        yield record
+
+def synthetic_logs(count, seed=7):
+    rng = random.Random(seed)
+    words = vocabulary(seed)
+    return [synthetic_log(rng, words, rng.choice(REPOS), rng.choice(WORKFLOWS)) for _ in range(count)]
+
+def synthetic_queries(count, seed=7):
+    rng = random.Random(seed)
+    words = vocabulary(seed)
+    return [fill(rng.choice(ERROR_TEMPLATES), rng, words, rng.choice(REPOS)) for _ in range(count)]
+
+def write_corpus(runs, seed=7, batch_size=1000):
+    from storage import insert_failures
+    batch = []
+    inserted = 0
+    for record in generate_failures(runs, seed):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            inserted += insert_failures(batch)
+            batch = []
+    return inserted + insert_failures(batch)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a reproducible synthetic CI failure corpus")
+    parser.add_argument("--runs", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write JSON lines here instead of the SQLite store")
+    args = parser.parse_args()
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            for record in generate_failures(args.runs, args.seed):
+                f.write(json.dumps(record) + "\n")
+        print(f"Wrote {args.runs} failures to {args.output}")
+    else:
+        print(f"Inserted {write_corpus(args.runs, args.seed)} failures")
@@ -0,0 +1,205 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = os.path.join(ROOT, "benchmarks", ".work")
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+SAMPLE_LOGS = 2000
+SAMPLE_QUERIES = 200
+SAMPLE_RUNS = 500
+HTTP_REQUESTS = 100
+REPEATS = 3
+DEFAULT_TOLERANCE = 0.25
+
+def timed(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def bench_extract_error_patterns(runs, seed):
+    from benchmarks.corpus import synthetic_logs
+    from ingestion import extract_error_patterns
+    logs = synthetic_logs(SAMPLE_LOGS, seed)
+    return timed(extract_error_patterns, [(log,) for log in logs]), 1
+
+def bench_build_graph(runs, seed):
+    from knowledge_graph import build_graph
+    return timed(build_graph, [()] * REPEATS), runs
+
+def bench_create_document_embeddings(runs, seed):
+    from embeddings import create_document_embeddings
+    return timed(create_document_embeddings, [()] * REPEATS), runs
+
+def bench_search_similar_failures(runs, seed):
+    from benchmarks.corpus import synthetic_queries
+    from embeddings import create_document_embeddings, search_similar_failures
+    vectorizer, embeddings, metadata = create_document_embeddings()
+    queries = synthetic_queries(SAMPLE_QUERIES, seed)
+    return timed(search_similar_failures, [(query, vectorizer, embeddings, metadata) for query in queries]), 1
+
+def bench_build_index(runs, seed):
+    import embeddings
+    def build():
+        embeddings.reset_index()
+        embeddings.load_indexes()
+    return timed(build, [()] * REPEATS), runs
+
+def bench_search_index(runs, seed):
+    from benchmarks.corpus import synthetic_queries
+    from embeddings import load_indexes, search_index
+    load_indexes()
+    queries = synthetic_queries(SAMPLE_QUERIES, seed)
+    return timed(search_index, [(query,) for query in queries]), 1
+
+def bench_find_similar_failures(runs, seed):
+    from benchmarks.corpus import RUN_ID_BASE
+    from knowledge_graph import find_similar_failures, get_graph
+    G = get_graph()
+    rng = random.Random(seed)
+    run_ids = [RUN_ID_BASE + rng.randrange(runs) for _ in range(SAMPLE_RUNS)]
+    return timed(find_similar_failures, [(G, run_id, 10) for run_id in run_ids]), 1
+
+def http_benchmark(method, path, body=None):
+    def bench(runs, seed):
+        os.environ.setdefault("DEVO_FAKE_LLM", "1")
+        os.environ.setdefault("DEVO_FAKE_LLM_DELAY", "0")
+        from fastapi.testclient import TestClient
+        from benchmarks.corpus import RUN_ID_BASE
+        import main
+        rng = random.Random(seed)
+        with TestClient(main.app) as client:
+            while client.get("/ready").status_code != 200:
+                time.sleep(0.05)
+            
+            def request():
+                run_id = RUN_ID_BASE + rng.randrange(runs)
+                payload = body(run_id) if callable(body) else body
+                response = client.request(method, path, json=payload)
+                response.raise_for_status()
+            request()
+            return timed(request, [()] * HTTP_REQUESTS), 1
+    return bench
+
+BENCHMARKS = {
+    "extract_error_patterns": bench_extract_error_patterns,
+    "build_graph": bench_build_graph,
+    "create_document_embeddings": bench_create_document_embeddings,
+    "search_similar_failures": bench_search_similar_failures,
+    "build_index": bench_build_index,
+    "search_index": bench_search_index,
+    "find_similar_failures": bench_find_similar_failures,
+    "http_stats": http_benchmark("GET", "/stats"),
+    "http_graph_page": http_benchmark("GET", "/graph?limit=100"),
+    "http_query": http_benchmark("POST", "/query", {"query": "npm ERR! code ELIFECYCLE", "top_k": 5}),
+    "http_analyze": http_benchmark("POST", "/analyze", lambda run_id: {"run_id": run_id, "query": "analyze ci failure"})
+}
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def summarize(samples, items):
+    samples = np.array(samples)
+    return {
+        "ops": len(samples),
+        "throughput": items * len(samples) / samples.sum(),
+        "p50_ms": float(np.percentile(samples, 50) * 1000),
+        "p99_ms": float(np.percentile(samples, 99) * 1000),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def work_dir(scale, seed):
+    path = os.path.join(WORK_DIR, f"{scale}-{seed}")
+    os.makedirs(os.path.join(path, "data"), exist_ok=True)
+    if not os.path.exists(os.path.join(path, "frontend")):
+        os.symlink(os.path.join(ROOT, "frontend"), os.path.join(path, "frontend"))
+    return path
+
+def prepare_corpus(path, runs, seed):
+    os.chdir(path)
+    from benchmarks.corpus import write_corpus
+    from storage import connect
+    count = connect().execute("SELECT COUNT(*) FROM failures").fetchone()[0]
+    if count != runs:
+        from storage import clear_failures
+        clear_failures()
+        write_corpus(runs, seed)
+    return runs
+
+def run_benchmark(name, path, runs, seed):
+    os.chdir(path)
+    samples, items = BENCHMARKS[name](runs, seed)
+    return summarize(samples, items)
+
+def in_child(fn, *args):
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, "r") as f:
+        return json.load(f)
+
+def regressions(result, baseline, tolerance):
+    found = []
+    if not baseline:
+        return found
+    if result["throughput"] < baseline["throughput"] * (1 - tolerance):
+        found.append(f"throughput {result['throughput']:.1f} < {baseline['throughput']:.1f}")
+    for metric in ("p50_ms", "p99_ms", "peak_rss_mb"):
+        if result[metric] > baseline[metric] * (1 + tolerance):
+            found.append(f"{metric} {result[metric]:.1f} > {baseline[metric]:.1f}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Devo pipeline on a synthetic corpus")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="10k")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--only", help="Comma-separated benchmark names")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+    
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    runs = SCALES[args.scale]
+    path = work_dir(args.scale, args.seed)
+    
+    print(f"Preparing {runs} synthetic failures in {path}...")
+    in_child(prepare_corpus, path, runs, args.seed)
+    
+    baseline = load_baseline()
+    scale_baseline = baseline.setdefault(args.scale, {})
+    failed = False
+    
+    print(f"{'benchmark':<28}{'ops':>6}{'throughput/s':>14}{'p50 ms':>10}{'p99 ms':>10}{'rss MB':>9}  status")
+    for name in names:
+        result = in_child(run_benchmark, name, path, runs, args.seed)
+        found = regressions(result, scale_baseline.get(name), args.tolerance)
+        failed = failed or bool(found)
+        status = "REGRESSION: " + "; ".join(found) if found else ("ok" if name in scale_baseline else "no baseline")
+        print(f"{name:<28}{result['ops']:>6}{result['throughput']:>14.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['peak_rss_mb']:>9.0f}  {status}")
+        if args.save_baseline:
+            scale_baseline[name] = result
+    
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {BASELINE_PATH}")
+    
+    return 1 if failed and not args.save_baseline else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
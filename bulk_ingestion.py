@@ -0,0 +1,177 @@
+import asyncio
+import random
+import tempfile
+import time
+from urllib.parse import urlsplit
+import httpx
+from ingestion import LOG_CHUNK_SIZE, build_failure_record, save_failures
+from events import wait_for_capacity
+from workers import run_io
+
+GITHUB_API = "https://api.github.com"
+MAX_CONNECTIONS = 64
+MAX_PER_HOST = 8
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+SAVE_BATCH_SIZE = 100
+
+def create_client():
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+        timeout=httpx.Timeout(30.0, read=120.0)
+    )
+
+def new_limiter(max_per_host=MAX_PER_HOST):
+    return {"max_per_host": max_per_host, "semaphores": {}, "pause_until": {}}
+
+def host_semaphore(limiter, host):
+    if host not in limiter["semaphores"]:
+        limiter["semaphores"][host] = asyncio.Semaphore(limiter["max_per_host"])
+    return limiter["semaphores"][host]
+
+def retry_delay(response, attempt):
+    retry_after = response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        reset = response.headers.get("X-RateLimit-Reset")
+        if reset and reset.isdigit():
+            return max(0.0, float(reset) - time.time()) + 1.0
+    
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random() / 2)
+
+def is_retryable(response):
+    if response.status_code in (429, 500, 502, 503, 504):
+        return True
+    return response.status_code == 403 and (
+        response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers
+    )
+
+async def wait_for_host(limiter, host):
+    delay = limiter["pause_until"].get(host, 0) - time.time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+def note_rate_limit(limiter, host, response):
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        reset = response.headers.get("X-RateLimit-Reset")
+        if reset and reset.isdigit():
+            limiter["pause_until"][host] = max(limiter["pause_until"].get(host, 0), float(reset) + 1.0)
+
+async def send(client, limiter, method, url, headers, sink=None):
+    host = urlsplit(url).netloc
+    for attempt in range(MAX_RETRIES + 1):
+        await wait_for_host(limiter, host)
+        async with host_semaphore(limiter, host):
+            async with client.stream(method, url, headers=headers) as response:
+                note_rate_limit(limiter, host, response)
+                if response.status_code == 200 and sink is not None:
+                    async for chunk in response.aiter_bytes(LOG_CHUNK_SIZE):
+                        sink.write(chunk)
+                else:
+                    await response.aread()
+        
+        if attempt < MAX_RETRIES and is_retryable(response):
+            delay = retry_delay(response, attempt)
+            if response.status_code in (403, 429):
+                limiter["pause_until"][host] = max(limiter["pause_until"].get(host, 0), time.time() + delay)
+            await asyncio.sleep(delay)
+            continue
+        return response
+
+def auth_headers(token):
+    return {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
+
+async def fetch_run(client, limiter, repo, run_id, token):
+    response = await send(client, limiter, "GET", f"{GITHUB_API}/repos/{repo}/actions/runs/{run_id}", auth_headers(token))
+    return response.json() if response.status_code == 200 else {}
+
+async def fetch_logs(client, limiter, repo, run_id, token):
+    spool = tempfile.TemporaryFile()
+    url = f"{GITHUB_API}/repos/{repo}/actions/runs/{run_id}/logs"
+    response = await send(client, limiter, "GET", url, auth_headers(token), spool)
+    
+    if response.status_code in (301, 302, 307, 308) and "Location" in response.headers:
+        await send(client, limiter, "GET", response.headers["Location"], {}, spool)
+    
+    spool.seek(0)
+    return spool
+
+async def list_failed_runs(client, limiter, repo, token, max_runs=100):
+    run_ids = []
+    page = 1
+    while len(run_ids) < max_runs:
+        url = f"{GITHUB_API}/repos/{repo}/actions/runs?status=failure&per_page=100&page={page}"
+        response = await send(client, limiter, "GET", url, auth_headers(token))
+        if response.status_code != 200:
+            break
+        runs = response.json().get("workflow_runs", [])
+        if not runs:
+            break
+        run_ids.extend(run["id"] for run in runs)
+        page += 1
+    return run_ids[:max_runs]
+
+async def ingest_run(client, limiter, repo, run_id, token):
+    run_data, logs = await asyncio.gather(
+        fetch_run(client, limiter, repo, run_id, token),
+        fetch_logs(client, limiter, repo, run_id, token)
+    )
+    with logs:
+        return await run_io(build_failure_record, repo, run_id, run_data, logs)
+
+async def list_failed_runs_for_repos(repos, token, max_runs_per_repo=100, client=None, limiter=None):
+    owns_client = client is None
+    client = client or create_client()
+    limiter = limiter or new_limiter()
+    
+    try:
+        run_lists = await asyncio.gather(*(
+            list_failed_runs(client, limiter, repo, token, max_runs_per_repo) for repo in repos
+        ))
+    finally:
+        if owns_client:
+            await client.aclose()
+    
+    return [(repo, run_id) for repo, run_ids in zip(repos, run_lists) for run_id in run_ids]
+
+async def ingest_runs(runs, token, client=None, limiter=None):
+    owns_client = client is None
+    client = client or create_client()
+    limiter = limiter or new_limiter()
+    
+    ingested = []
+    failed = []
+    pending = []
+    
+    async def worker(repo, run_id):
+        try:
+            record = await ingest_run(client, limiter, repo, run_id, token)
+            pending.append(record)
+            ingested.append({"repo": repo, "run_id": run_id, "error_patterns": len(record["error_patterns"])})
+            if len(pending) >= SAVE_BATCH_SIZE:
+                batch = pending[:]
+                pending.clear()
+                await run_io(save_failures, batch)
+                await wait_for_capacity()
+        except Exception as e:
+            failed.append({"repo": repo, "run_id": run_id, "error": str(e)})
+    
+    try:
+        await asyncio.gather(*(worker(repo, run_id) for repo, run_id in dict.fromkeys(runs)))
+        await run_io(save_failures, pending)
+    finally:
+        if owns_client:
+            await client.aclose()
+    
+    return {"ingested": ingested, "failed": failed}
+
+async def backfill_repos(repos, token, max_runs_per_repo=100, exclude=None):
+    limiter = new_limiter()
+    async with create_client() as client:
+        runs = await list_failed_runs_for_repos(repos, token, max_runs_per_repo, client, limiter)
+        if exclude:
+            runs = [(repo, run_id) for repo, run_id in runs if not exclude(repo, run_id)]
+        return await ingest_runs(runs, token, client, limiter)
@@ -1,4 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from metrics import get_profile, render_prometheus
 import json
 import requests
 
@@ -16,11 +18,11 @@ def fetch_monitoring_alerts():
 
 @router.get("/metrics")
 def fetch_system_metrics():
-    return {
-        "status": "success",
-        "metrics": {
-            "failure_rate": 0.15,
-            "avg_build_time": 120,
-            "success_rate": 0.85
-        }
-    }
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/profiles/{profile_id}")
+def fetch_profile(profile_id: str):
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile)
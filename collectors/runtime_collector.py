@@ -1,45 +1,60 @@
-from fastapi import APIRouter
-import psutil
+from datetime import datetime
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Any, List, Optional
+from runtime_sampler import WINDOWS, events_between, record_event, series, system_snapshot, top_processes, window_series
+from storage import get_failure
 import time
 
 router = APIRouter(prefix="/runtime")
 
+CORRELATION_WINDOW = 300
+
+class RuntimeEvent(BaseModel):
+    service: str = "unknown"
+    errors: List[Any] = []
+    timestamp: Optional[float] = None
+
 @router.get("/system")
 def get_system_metrics():
-    return {
-        "cpu_percent": psutil.cpu_percent(),
-        "memory": {
-            "total": psutil.virtual_memory().total,
-            "available": psutil.virtual_memory().available,
-            "percent": psutil.virtual_memory().percent
-        },
-        "disk": {
-            "total": psutil.disk_usage('/').total,
-            "free": psutil.disk_usage('/').free,
-            "percent": psutil.disk_usage('/').percent
-        },
-        "timestamp": time.time()
-    }
+    return system_snapshot()
 
 @router.get("/processes")
 def get_processes():
-    processes = []
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-        try:
-            processes.append(proc.info)
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return {"processes": processes[:10]}
+    return {"processes": top_processes()}
+
+@router.get("/history")
+def get_runtime_history(window: str = "1h"):
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"Unsupported window, use one of {list(WINDOWS)}")
+    return {"window": window, "points": window_series(window)}
 
 @router.post("/collect")
-def collect_runtime_data(data: dict):
-    metrics = get_system_metrics()
+def collect_runtime_data(data: RuntimeEvent):
+    runtime_data = record_event(data.service, data.errors, data.timestamp)
+    return {"message": "Runtime data collected", "data": runtime_data}
+
+@router.get("/errors")
+def get_runtime_errors(since: Optional[float] = None, until: Optional[float] = None, service: Optional[str] = None):
+    until = time.time() if until is None else until
+    since = until - 3600 if since is None else since
+    return {"errors": events_between(since, until, service)}
+
+@router.get("/correlate")
+def correlate_failure(run_id: int, window: int = CORRELATION_WINDOW):
+    failure = get_failure(run_id)
+    if failure is None:
+        raise HTTPException(status_code=404, detail="Failure not found")
+    try:
+        failed_at = datetime.fromisoformat(failure["timestamp"]).timestamp()
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="Failure has no usable timestamp")
     
-    runtime_data = {
-        "timestamp": metrics["timestamp"],
-        "service": data.get("service", "unknown"),
-        "metrics": metrics,
-        "errors": data.get("errors", [])
+    return {
+        "run_id": run_id,
+        "repo": failure["repo"],
+        "failed_at": failed_at,
+        "window_seconds": window,
+        "runtime_errors": events_between(failed_at - window, failed_at + window),
+        "metrics": series(failed_at - window, failed_at + window)
     }
-    
-    return {"message": "Runtime data collected", "data": runtime_data}
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+from metrics import register_collector
+import time
+from collections import OrderedDict
+from signatures import normalize_text
+
+CACHE_PATH = "data/diagnosis_cache.json"
+CACHE_MAX_ENTRIES = int(os.getenv("DEVO_DIAGNOSIS_CACHE_SIZE", 10000))
+CACHE_TTL = int(os.getenv("DEVO_DIAGNOSIS_CACHE_TTL", 7 * 24 * 3600))
+CACHE_SAVE_EVERY = 50
+
+_cache = {"entries": None, "dirty": 0, "hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+_cache_lock = threading.Lock()
+_save_lock = threading.Lock()
+
+def fingerprint(context, query):
+    errors = sorted({
+        (node.get("keyword"), normalize_text(node.get("context")))
+        for node in context.get("failure_path", []) if node.get("type") == "error"
+    })
+    lines = sorted({normalize_text(line) for line in context.get("error_lines", [])})
+    retrieved = sorted({
+        normalize_text(error)
+        for hit in context.get("similar_failures", [])
+        for error in hit.get("errors", [])
+    })
+    payload = json.dumps({"query": normalize_text(query), "errors": errors, "lines": lines, "retrieved": retrieved}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_cache():
+    entries = OrderedDict()
+    if os.path.exists(CACHE_PATH):
+        try:
+            with open(CACHE_PATH, "r") as f:
+                for key, entry in json.load(f):
+                    entries[key] = entry
+        except (ValueError, OSError):
+            entries = OrderedDict()
+    _cache["entries"] = entries
+
+def cache_entries():
+    if _cache["entries"] is None:
+        load_cache()
+    return _cache["entries"]
+
+def get_cached_diagnosis(key):
+    with _cache_lock:
+        entries = cache_entries()
+        entry = entries.get(key)
+        if entry is None:
+            _cache["misses"] += 1
+            return None
+        if time.time() - entry["created_at"] > CACHE_TTL:
+            del entries[key]
+            _cache["expired"] += 1
+            _cache["misses"] += 1
+            return None
+        entries.move_to_end(key)
+        entry["hits"] += 1
+        _cache["hits"] += 1
+        return entry["diagnosis"]
+
+def put_cached_diagnosis(key, diagnosis):
+    with _cache_lock:
+        entries = cache_entries()
+        entries[key] = {"diagnosis": diagnosis, "created_at": time.time(), "hits": 0}
+        entries.move_to_end(key)
+        while len(entries) > CACHE_MAX_ENTRIES:
+            entries.popitem(last=False)
+            _cache["evictions"] += 1
+        _cache["dirty"] += 1
+        should_save = _cache["dirty"] >= CACHE_SAVE_EVERY
+    if should_save:
+        save_cache()
+
+def save_cache():
+    with _save_lock:
+        with _cache_lock:
+            if _cache["entries"] is None or not _cache["dirty"]:
+                return 0
+            snapshot = list(_cache["entries"].items())
+            _cache["dirty"] = 0
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        with open(CACHE_PATH + ".tmp", "w") as f:
+            json.dump(snapshot, f)
+        os.replace(CACHE_PATH + ".tmp", CACHE_PATH)
+        return len(snapshot)
+
+def cache_stats():
+    with _cache_lock:
+        lookups = _cache["hits"] + _cache["misses"]
+        return {
+            "entries": len(cache_entries()),
+            "max_entries": CACHE_MAX_ENTRIES,
+            "ttl_seconds": CACHE_TTL,
+            "hits": _cache["hits"],
+            "misses": _cache["misses"],
+            "expired": _cache["expired"],
+            "evictions": _cache["evictions"],
+            "hit_rate": _cache["hits"] / lookups if lookups else 0.0
+        }
+
+def cache_samples():
+    stats = cache_stats()
+    return [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]
+
+def cache_size_samples():
+    return [({}, cache_stats()["entries"])]
+
+register_collector("devo_diagnosis_cache_lookups_total", "counter", "Diagnosis cache lookups by result", cache_samples)
+register_collector("devo_diagnosis_cache_entries", "gauge", "Diagnoses held in the cache", cache_size_samples)
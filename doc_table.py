@@ -0,0 +1,161 @@
+import json
+import mmap
+import os
+from datetime import datetime
+import numpy as np
+
+COLUMNS = {
+    "run_id": np.int64,
+    "repo": np.int32,
+    "workflow": np.int32,
+    "status": np.int16,
+    "conclusion": np.int16,
+    "timestamp": np.float64,
+    "record_offset": np.int64,
+    "record_length": np.int32
+}
+CODED_COLUMNS = ["repo", "workflow", "status", "conclusion"]
+
+def new_table(path):
+    os.makedirs(path, exist_ok=True)
+    open(os.path.join(path, "records.blob"), "wb").close()
+    return {
+        "path": path,
+        "size": 0,
+        "columns": {name: np.zeros(1024, dtype=dtype) for name, dtype in COLUMNS.items()},
+        "values": {name: [] for name in CODED_COLUMNS},
+        "codes": {name: {} for name in CODED_COLUMNS},
+        "blob_sizes": {"records.blob": 0},
+        "maps": {}
+    }
+
+def encode(table, column, value):
+    codes = table["codes"][column]
+    if value not in codes:
+        codes[value] = len(table["values"][column])
+        table["values"][column].append(value)
+    return codes[value]
+
+def parse_timestamp(value):
+    if not value:
+        return np.nan
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return np.nan
+
+def grow(table, count):
+    needed = table["size"] + count
+    capacity = len(table["columns"]["run_id"])
+    if needed <= capacity:
+        return
+    capacity = max(capacity, 1024)
+    while capacity < needed:
+        capacity *= 2
+    for name, column in table["columns"].items():
+        grown = np.zeros(capacity, dtype=column.dtype)
+        grown[:table["size"]] = column[:table["size"]]
+        table["columns"][name] = grown
+
+def append_blob(table, name, chunks):
+    offsets = []
+    with open(os.path.join(table["path"], name), "ab") as f:
+        f.seek(table["blob_sizes"][name])
+        f.truncate()
+        for chunk in chunks:
+            offsets.append((table["blob_sizes"][name], len(chunk)))
+            f.write(chunk)
+            table["blob_sizes"][name] += len(chunk)
+    table["maps"].pop(name, None)
+    return offsets
+
+def append_rows(table, failures):
+    if not failures:
+        return 0
+    grow(table, len(failures))
+    
+    records = append_blob(table, "records.blob", [
+        json.dumps({"commit": f.get("commit"), "error_patterns": f["error_patterns"]}).encode("utf-8")
+        for f in failures
+    ])
+    
+    columns = table["columns"]
+    for i, failure in enumerate(failures):
+        row = table["size"] + i
+        columns["run_id"][row] = failure["run_id"]
+        for name in CODED_COLUMNS:
+            columns[name][row] = encode(table, name, failure.get(name))
+        columns["timestamp"][row] = parse_timestamp(failure.get("timestamp"))
+        columns["record_offset"][row], columns["record_length"][row] = records[i]
+    
+    table["size"] += len(failures)
+    return len(failures)
+
+def blob_view(table, name):
+    if name not in table["maps"]:
+        if table["blob_sizes"][name] == 0:
+            return b""
+        with open(os.path.join(table["path"], name), "rb") as f:
+            table["maps"][name] = mmap.mmap(f.fileno(), table["blob_sizes"][name], access=mmap.ACCESS_READ)
+    return table["maps"][name]
+
+def get_record(table, row):
+    columns = table["columns"]
+    offset, length = int(columns["record_offset"][row]), int(columns["record_length"][row])
+    record = json.loads(blob_view(table, "records.blob")[offset:offset + length])
+    timestamp = columns["timestamp"][row]
+    
+    return {
+        "run_id": int(columns["run_id"][row]),
+        **{name: table["values"][name][columns[name][row]] for name in CODED_COLUMNS},
+        "commit": record["commit"],
+        "timestamp": None if np.isnan(timestamp) else datetime.fromtimestamp(timestamp).isoformat(),
+        "error_patterns": record["error_patterns"]
+    }
+
+def column_path(path, name):
+    return os.path.join(path, f"column_{name}.npy")
+
+def save_table(table):
+    path = table["path"]
+    for name, column in table["columns"].items():
+        with open(column_path(path, name) + ".tmp", "wb") as f:
+            np.save(f, column[:table["size"]])
+    with open(os.path.join(path, "table.json.tmp"), "w") as f:
+        json.dump({"size": table["size"], "values": table["values"], "blob_sizes": table["blob_sizes"]}, f)
+    for name in table["columns"]:
+        os.replace(column_path(path, name) + ".tmp", column_path(path, name))
+    os.replace(os.path.join(path, "table.json.tmp"), os.path.join(path, "table.json"))
+
+def load_table(path):
+    meta_path = os.path.join(path, "table.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    
+    table = {
+        "path": path,
+        "size": meta["size"],
+        "columns": {},
+        "values": meta["values"],
+        "codes": {name: {value: code for code, value in enumerate(values)} for name, values in meta["values"].items()},
+        "blob_sizes": meta["blob_sizes"],
+        "maps": {}
+    }
+    
+    for name, dtype in COLUMNS.items():
+        if not os.path.exists(column_path(path, name)):
+            return None
+        column = np.load(column_path(path, name), mmap_mode="r")
+        if column.dtype != dtype or len(column) != meta["size"]:
+            return None
+        table["columns"][name] = column
+    
+    for name, size in meta["blob_sizes"].items():
+        if os.path.getsize(os.path.join(path, name)) < size:
+            return None
+    
+    return table
@@ -1,17 +1,39 @@
+import heapq
+import itertools
 import json
+import os
+import threading
+import faiss
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from doc_table import new_table, append_rows, get_record, parse_timestamp, save_table, load_table
+from storage import load_failures, read_new_failures, store_version
+from ingestion import ERROR_MATCHER
+from signatures import normalize_text
+from log_store import read_log_ranges
+from shards import SHARD_COUNT, SHARD_LAYOUT, shard_dir, target_shards
+from metrics import inc, timed
 
-def load_failures():
-    failures = []
-    try:
-        with open("data/failures.json", "r") as f:
-            for line in f:
-                failures.append(json.loads(line.strip()))
-    except FileNotFoundError:
-        pass
-    return failures
+INDEX_DIR = "data/index"
+INDEX_FORMAT = 2
+VECTOR_DIM = 256
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+EXACT_WINDOW_ROWS = 10000
+RELEVANT_LINES = 20
+LOG_CONTEXT_LINES = 2
+LOG_TAIL_LINES = 50
+MAX_LOG_WINDOWS = 20
+
+hasher = HashingVectorizer(n_features=VECTOR_DIM, stop_words='english', alternate_sign=True, norm='l2')
+
+index_lock = threading.RLock()
+_indexes = {}
+
+def failure_text(failure):
+    error_text = " ".join([p['line'] for p in failure['error_patterns']])
+    return f"{failure['repo']} {failure['workflow']} {failure['status']} {error_text}"
 
 def create_document_embeddings():
     failures = load_failures()
@@ -23,11 +45,7 @@ def create_document_embeddings():
     
     for failure in failures:
         doc_id = f"run_{failure['run_id']}"
-        
-        error_text = " ".join([p['line'] for p in failure['error_patterns']])
-        doc_text = f"{failure['repo']} {failure['workflow']} {failure['status']} {error_text}"
-        
-        documents.append(doc_text)
+        documents.append(failure_text(failure))
         doc_metadata[doc_id] = failure
     
     vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
@@ -42,11 +60,12 @@ def search_similar_failures(query, vectorizer, embeddings, doc_metadata, top_k=3
     query_vector = vectorizer.transform([query])
     similarities = cosine_similarity(query_vector, embeddings).flatten()
     
-    top_indices = similarities.argsort()[-top_k:][::-1]
+    top_indices = top_k_indices(similarities, top_k)
     
+    doc_ids = list(doc_metadata)
     results = []
     for idx in top_indices:
-        doc_id = list(doc_metadata.keys())[idx]
+        doc_id = doc_ids[idx]
         score = similarities[idx]
         results.append({
             "doc_id": doc_id,
@@ -56,19 +75,196 @@ def search_similar_failures(query, vectorizer, embeddings, doc_metadata, top_k=3
     
     return results
 
-def extract_relevant_context(failure_data, query):
-    relevant_lines = []
+def top_k_indices(scores, k):
+    if k <= 0 or len(scores) == 0:
+        return np.array([], dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def vectorize(texts):
+    return hasher.transform(texts).toarray().astype(np.float32)
+
+def new_index():
+    index = faiss.IndexHNSWFlat(VECTOR_DIM, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+@timed("index_append")
+def append_failures(state, failures):
+    if not failures:
+        return 0
+    inc("devo_stage_items_total", len(failures), stage="index_append")
+    state["index"].add(vectorize([failure_text(f) for f in failures]))
+    return append_rows(state["docs"], failures)
+
+def load_index(shard):
+    path = shard_dir(INDEX_DIR, shard)
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    if meta.get("layout") != SHARD_LAYOUT or meta.get("format") != INDEX_FORMAT:
+        return None
+    index = faiss.read_index(os.path.join(path, "vectors.faiss"), faiss.IO_FLAG_MMAP)
+    docs = load_table(path)
+    if docs is None or index.ntotal != docs["size"] or index.d != VECTOR_DIM:
+        return None
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return {"index": index, "docs": docs, "store_id": meta["store_id"], "last_id": meta["last_id"]}
+
+def save_shard_index(shard, state):
+    path = shard_dir(INDEX_DIR, shard)
+    os.makedirs(path, exist_ok=True)
+    faiss.write_index(state["index"], os.path.join(path, "vectors.faiss.tmp"))
+    save_table(state["docs"])
+    with open(os.path.join(path, "meta.json.tmp"), "w") as f:
+        json.dump({"format": INDEX_FORMAT, "layout": SHARD_LAYOUT, "store_id": state["store_id"], "last_id": state["last_id"], "count": state["docs"]["size"]}, f)
+    os.replace(os.path.join(path, "vectors.faiss.tmp"), os.path.join(path, "vectors.faiss"))
+    os.replace(os.path.join(path, "meta.json.tmp"), os.path.join(path, "meta.json"))
+    return state["docs"]["size"]
+
+def save_index(shard=None):
+    with index_lock:
+        return sum(save_shard_index(s, state) for s, state in _indexes.items() if shard is None or s == shard)
+
+def new_state(shard):
+    return {"index": new_index(), "docs": new_table(shard_dir(INDEX_DIR, shard)), "store_id": None, "last_id": 0}
+
+def reset_index(shard=None):
+    with index_lock:
+        for shard in range(SHARD_COUNT) if shard is None else [shard]:
+            _indexes[shard] = new_state(shard)
+
+def get_index(shard):
+    with index_lock:
+        if shard not in _indexes:
+            _indexes[shard] = load_index(shard) or new_state(shard)
+        state = _indexes[shard]
+        
+        store_id, last_id = store_version()
+        if store_id != state["store_id"] or last_id < state["last_id"]:
+            state = _indexes[shard] = new_state(shard)
+            state["store_id"] = store_id
+        
+        if last_id > state["last_id"]:
+            failures, read_id = read_new_failures(state["last_id"], shard)
+            append_failures(state, failures)
+            state["last_id"] = max(read_id, last_id)
+        
+        return state
+
+def load_indexes():
+    return [get_index(shard) for shard in range(SHARD_COUNT)]
+
+def candidate_rows(docs, since=None, repo=None):
+    if since is None and repo is None:
+        return None
+    mask = np.ones(docs["size"], dtype=bool)
+    if since is not None:
+        mask &= docs["columns"]["timestamp"][:docs["size"]] >= parse_timestamp(since)
+    if repo is not None:
+        code = docs["codes"]["repo"].get(repo)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        mask &= docs["columns"]["repo"][:docs["size"]] == code
+    return np.flatnonzero(mask)
+
+def search_rows(index, vectors, rows, top_k):
+    if len(rows) <= EXACT_WINDOW_ROWS:
+        scores = vectors @ index.reconstruct_batch(rows).T
+        best = [top_k_indices(row_scores, top_k) for row_scores in scores]
+        return np.array([row_scores[b] for row_scores, b in zip(scores, best)]), np.array([rows[b] for b in best])
+    selector = faiss.IDSelectorBatch(rows)
+    return index.search(vectors, top_k, params=faiss.SearchParametersHNSW(sel=selector, efSearch=max(HNSW_EF_SEARCH, top_k)))
+
+@timed("index_search")
+def search_shard(shard, queries, top_k=3, since=None, repo=None):
+    unique_queries = list(dict.fromkeys(queries))
+    with index_lock:
+        state = get_index(shard)
+        rows = candidate_rows(state["docs"], since, repo)
+        total = state["index"].ntotal if rows is None else len(rows)
+        if total == 0:
+            return [[] for _ in queries]
+        if rows is None:
+            scores, ids = state["index"].search(vectorize(unique_queries), min(top_k, total))
+        else:
+            scores, ids = search_rows(state["index"], vectorize(unique_queries), rows, min(top_k, total))
+        
+        records = {}
+        results = {}
+        for query, query_scores, query_ids in zip(unique_queries, scores, ids):
+            results[query] = []
+            for score, idx in zip(query_scores, query_ids):
+                if idx < 0:
+                    continue
+                if idx not in records:
+                    records[idx] = get_record(state["docs"], idx)
+                results[query].append({
+                    "doc_id": f"run_{records[idx]['run_id']}",
+                    "similarity": float(score),
+                    "metadata": records[idx]
+                })
     
-    for pattern in failure_data['error_patterns']:
-        if any(word in pattern['line'].lower() for word in query.lower().split()):
-            relevant_lines.append(pattern['line'])
+    return [results[query] for query in queries]
+
+def shard_similarities(shard, requests):
+    with index_lock:
+        state = get_index(shard)
+        docs = state["docs"]
+        run_ids = docs["columns"]["run_id"][:docs["size"]]
+        wanted = list({run_id for _, candidates in requests for run_id in candidates})
+        rows = np.flatnonzero(np.isin(run_ids, wanted)) if wanted else np.zeros(0, dtype=np.int64)
+        if not len(rows):
+            return [{} for _ in requests]
+        
+        positions = {int(run_ids[row]): i for i, row in enumerate(rows)}
+        vectors = state["index"].reconstruct_batch(rows)
+        queries = list(dict.fromkeys(query for query, _ in requests))
+        query_vectors = dict(zip(queries, vectorize(queries)))
+    
+    return [
+        {f"run_{run_id}": float(query_vectors[query] @ vectors[positions[run_id]]) for run_id in candidates if run_id in positions}
+        for query, candidates in requests
+    ]
+
+def merge_hits(shard_results, top_k):
+    return [
+        heapq.nsmallest(top_k, itertools.chain.from_iterable(hits), key=lambda hit: (-hit["similarity"], hit["doc_id"]))
+        for hits in zip(*shard_results)
+    ]
+
+def search_index(query, top_k=3, since=None, repo=None):
+    return search_index_batch([query], top_k, since, repo)[0]
+
+def search_index_batch(queries, top_k=3, since=None, repo=None):
+    return merge_hits([search_shard(shard, queries, top_k, since, repo) for shard in target_shards(repo)], top_k)
+
+def log_windows(failure_data):
+    windows = [(-LOG_TAIL_LINES, None)]
+    for pattern in failure_data['error_patterns'][:MAX_LOG_WINDOWS]:
+        if 'line_no' in pattern:
+            windows.append((max(0, pattern['line_no'] - LOG_CONTEXT_LINES), pattern['line_no'] + LOG_CONTEXT_LINES + 1))
+    return windows
+
+def extract_relevant_context(failure_data, query, limit=RELEVANT_LINES):
+    words = {word for word in query.lower().split() if len(word) > 2}
+    candidates = [(pattern['line'], 1) for pattern in failure_data['error_patterns']]
+    candidates += [(line, 0) for _, line in read_log_ranges(failure_data['repo'], failure_data['run_id'], log_windows(failure_data))]
     
-    if failure_data['raw_logs']:
-        log_lines = failure_data['raw_logs'].split('\n')
-        for line in log_lines:
-            if any(word in line.lower() for word in query.lower().split()):
-                relevant_lines.append(line)
-                if len(relevant_lines) >= 5:
-                    break
+    scored = {}
+    for position, (line, bonus) in enumerate(candidates):
+        line = line.strip()
+        lowered = line.lower()
+        score = 2 * sum(word in lowered for word in words) + bool(ERROR_MATCHER.search(line)) + bonus
+        if not score:
+            continue
+        signature = normalize_text(line)
+        if signature not in scored or scored[signature][0] < score:
+            scored[signature] = (score, -position, line)
     
-    return relevant_lines
+    return [line for _, _, line in heapq.nlargest(limit, scored.values())]
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from metrics import inc, observe, register_collector
+from workers import run_io, scatter, warm_shard
+from shards import shard_of
+
+EVENT_QUEUE_SIZE = int(os.getenv("DEVO_EVENT_QUEUE_SIZE", 10000))
+EVENT_HIGH_WATERMARK = EVENT_QUEUE_SIZE // 2
+COALESCE_DELAY = float(os.getenv("DEVO_EVENT_COALESCE_DELAY", 0.5))
+AUTO_ANALYZE = os.getenv("DEVO_AUTO_ANALYZE", "0") == "1"
+AUTO_ANALYSIS_QUERY = "analyze ci failure"
+
+_stages = {}
+_pipeline = {"loop": None, "drained": None}
+
+async def update_shards(events):
+    await scatter(warm_shard, sorted({shard_of(event["repo"]) for event in events}))
+
+async def update_stats(events):
+    from failure_stats import refresh_stats
+    await run_io(refresh_stats)
+
+async def analyze_events(events):
+    from graph_rag import graph_rag_pipeline_batch
+    run_ids = dict.fromkeys(event["run_id"] for event in events)
+    await graph_rag_pipeline_batch([(run_id, AUTO_ANALYSIS_QUERY) for run_id in run_ids])
+
+def default_stages():
+    stages = {"shards": update_shards, "stats": update_stats}
+    if AUTO_ANALYZE:
+        stages["analysis"] = analyze_events
+    return stages
+
+def start_pipeline(stages=None):
+    if _pipeline["loop"] is not None:
+        return
+    _pipeline["loop"] = asyncio.get_running_loop()
+    _pipeline["drained"] = asyncio.Event()
+    _pipeline["drained"].set()
+    for name, handler in (stages or default_stages()).items():
+        stage = {
+            "handler": handler,
+            "queue": asyncio.Queue(maxsize=EVENT_QUEUE_SIZE),
+            "processed": 0,
+            "batches": 0,
+            "dropped": 0,
+            "errors": 0,
+            "last_error": None,
+            "last_batch_at": None,
+            "last_latency": None
+        }
+        stage["task"] = asyncio.create_task(run_stage(name, stage))
+        _stages[name] = stage
+
+async def stop_pipeline():
+    tasks = [stage["task"] for stage in _stages.values()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _stages.clear()
+    _pipeline.update(loop=None, drained=None)
+
+async def run_stage(name, stage):
+    queue = stage["queue"]
+    while True:
+        events = [await queue.get()]
+        await asyncio.sleep(COALESCE_DELAY)
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        
+        start = time.perf_counter()
+        try:
+            await stage["handler"](events)
+        except Exception as e:
+            stage["errors"] += 1
+            stage["last_error"] = str(e)
+            inc("devo_stage_errors_total", stage=f"event_{name}")
+        observe("devo_event_batch_duration_seconds", time.perf_counter() - start, stage=name)
+        
+        stage["processed"] += len(events)
+        stage["batches"] += 1
+        stage["last_batch_at"] = time.time()
+        stage["last_latency"] = time.time() - min(event["emitted_at"] for event in events)
+        observe("devo_event_latency_seconds", stage["last_latency"], stage=name)
+        inc("devo_events_processed_total", len(events), stage=name)
+        update_backlog()
+
+def pending_events():
+    return max((stage["queue"].qsize() for stage in _stages.values()), default=0)
+
+def update_backlog():
+    if pending_events() < EVENT_HIGH_WATERMARK:
+        _pipeline["drained"].set()
+    else:
+        _pipeline["drained"].clear()
+
+def enqueue(events):
+    for stage in _stages.values():
+        queue = stage["queue"]
+        for event in events:
+            if queue.full():
+                queue.get_nowait()
+                stage["dropped"] += 1
+            queue.put_nowait(event)
+    update_backlog()
+
+def publish(failures):
+    loop = _pipeline["loop"]
+    if loop is None or not failures:
+        return
+    now = time.time()
+    events = [{"repo": failure["repo"], "run_id": failure["run_id"], "emitted_at": now} for failure in failures]
+    
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        enqueue(events)
+    else:
+        loop.call_soon_threadsafe(enqueue, events)
+
+async def wait_for_capacity():
+    if _pipeline["drained"] is not None:
+        await _pipeline["drained"].wait()
+
+def pipeline_stats():
+    return {
+        name: {key: value for key, value in stage.items() if key not in ("handler", "queue", "task")} | {"pending": stage["queue"].qsize()}
+        for name, stage in _stages.items()
+    }
+
+def queue_samples():
+    return [({"stage": name}, stage["queue"].qsize()) for name, stage in _stages.items()]
+
+def dropped_samples():
+    return [({"stage": name}, stage["dropped"]) for name, stage in _stages.items()]
+
+register_collector("devo_event_queue_pending", "gauge", "Events waiting in each stage queue", queue_samples)
+register_collector("devo_events_dropped_total", "counter", "Events dropped because a stage queue was full", dropped_samples)
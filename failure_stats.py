@@ -0,0 +1,212 @@
+import heapq
+import json
+import os
+import threading
+from collections import Counter
+from storage import get_clusters, iter_failures, load_rollups, store_version
+from metrics import register_collector, timed
+
+STATS_DIR = "data"
+TOP_N = 20
+MAX_TOP_N = 1000
+TIMELINE_HOURS = 48
+TIMELINE_DAYS = 30
+SNAPSHOT_PATH = os.path.join(STATS_DIR, "stats_snapshot.json")
+SNAPSHOT_FORMAT = 2
+COUNTER_KEYS = ["repos", "workflows", "keywords", "clusters", "hourly", "daily"]
+
+stats_lock = threading.RLock()
+_stats = {"store_id": None, "last_id": 0, "views": {}}
+
+def new_aggregates():
+    return {
+        "failures": 0,
+        "repos": Counter(),
+        "workflows": Counter(),
+        "keywords": Counter(),
+        "clusters": Counter(),
+        "cluster_labels": {},
+        "repo_workflows": set(),
+        "run_errors": 0,
+        "hourly": Counter(),
+        "daily": Counter()
+    }
+
+def add_failure(aggregates, failure):
+    aggregates["failures"] += 1
+    aggregates["repos"][failure["repo"]] += 1
+    aggregates["workflows"][failure["workflow"]] += 1
+    aggregates["repo_workflows"].add((failure["repo"], failure["workflow"]))
+    
+    timestamp = failure.get("timestamp") or ""
+    if len(timestamp) >= 13:
+        aggregates["hourly"][timestamp[:13]] += 1
+        aggregates["daily"][timestamp[:10]] += 1
+    
+    errors = set()
+    for pattern in failure["error_patterns"]:
+        aggregates["keywords"][pattern["keyword"]] += 1
+        cluster = pattern.get("cluster", f"{pattern['keyword']}_{failure['run_id']}")
+        if cluster not in errors:
+            errors.add(cluster)
+            aggregates["clusters"][cluster] += 1
+        if cluster not in aggregates["cluster_labels"]:
+            aggregates["cluster_labels"][cluster] = (pattern["keyword"], pattern.get("signature"))
+    aggregates["run_errors"] += len(errors)
+
+def add_rollups(aggregates, runs, errors, hours, keywords):
+    for repo, workflow, day, failures, run_errors in runs:
+        aggregates["failures"] += failures
+        aggregates["repos"][repo] += failures
+        aggregates["workflows"][workflow] += failures
+        aggregates["repo_workflows"].add((repo, workflow))
+        aggregates["run_errors"] += run_errors
+        if day:
+            aggregates["daily"][day] += failures
+    
+    for repo, workflow, day, error, keyword, signature, context, failures, patterns in errors:
+        cluster = int(error) if error.isdigit() else error
+        aggregates["clusters"][cluster] += failures
+        aggregates["cluster_labels"].setdefault(cluster, (keyword, signature))
+    
+    for hour, failures in hours:
+        aggregates["hourly"][hour] += failures
+    for keyword, patterns in keywords:
+        aggregates["keywords"][keyword] += patterns
+    return aggregates
+
+def dump_aggregates(aggregates):
+    return {
+        "failures": aggregates["failures"],
+        "run_errors": aggregates["run_errors"],
+        **{key: list(aggregates[key].items()) for key in ["cluster_labels"] + COUNTER_KEYS},
+        "repo_workflows": list(aggregates["repo_workflows"])
+    }
+
+def load_aggregates(saved):
+    aggregates = new_aggregates()
+    aggregates["failures"] = saved["failures"]
+    aggregates["run_errors"] = saved["run_errors"]
+    for key in COUNTER_KEYS:
+        aggregates[key].update(dict(saved[key]))
+    aggregates["cluster_labels"] = {cluster: tuple(label) for cluster, label in saved["cluster_labels"]}
+    aggregates["repo_workflows"] = {tuple(pair) for pair in saved["repo_workflows"]}
+    return aggregates
+
+def load_stats_snapshot(store_id, last_id):
+    try:
+        with open(SNAPSHOT_PATH, "r") as f:
+            snapshot = json.load(f)
+        if snapshot.get("format") != SNAPSHOT_FORMAT or snapshot["store_id"] != store_id or snapshot["last_id"] > last_id:
+            return False
+        aggregates = load_aggregates(snapshot["aggregates"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+    _stats.update(aggregates=aggregates, store_id=store_id, last_id=snapshot["last_id"], views={})
+    return True
+
+@timed("stats_refresh")
+def refresh_stats():
+    with stats_lock:
+        store_id, last_id = store_version()
+        if "aggregates" not in _stats:
+            load_stats_snapshot(store_id, last_id)
+        if "aggregates" not in _stats or store_id != _stats["store_id"] or last_id < _stats["last_id"]:
+            _stats.update(aggregates=add_rollups(new_aggregates(), *load_rollups()), store_id=store_id, last_id=0, views={})
+        
+        if last_id > _stats["last_id"]:
+            for _stats["last_id"], failure in iter_failures(_stats["last_id"]):
+                add_failure(_stats["aggregates"], failure)
+            _stats["views"] = {}
+        
+        return _stats["aggregates"]
+
+def top_counts(counter, top_n):
+    return heapq.nsmallest(top_n, counter.items(), key=lambda x: (-x[1], str(x[0])))
+
+def timeline(counter, buckets):
+    return [{"bucket": bucket, "failures": counter[bucket]} for bucket in sorted(counter)[-buckets:]]
+
+def cluster_labels(aggregates, clusters):
+    labels = {cluster: aggregates["cluster_labels"][cluster] for cluster in clusters}
+    for cluster, row in get_clusters([cluster for cluster in clusters if isinstance(cluster, int)]).items():
+        labels[cluster] = (row["keyword"], row["signature"])
+    return labels
+
+def stats_view(aggregates, top_n):
+    top_clusters = top_counts(aggregates["clusters"], top_n)
+    labels = cluster_labels(aggregates, [cluster for cluster, count in top_clusters])
+    node_types = {
+        "repository": len(aggregates["repos"]),
+        "workflow": len(aggregates["workflows"]),
+        "run": aggregates["failures"],
+        "error": len(aggregates["clusters"])
+    }
+    return {
+        "failures": aggregates["failures"],
+        "nodes": sum(node_types.values()),
+        "edges": len(aggregates["repo_workflows"]) + aggregates["failures"] + aggregates["run_errors"],
+        "node_types": node_types,
+        "repos": top_counts(aggregates["repos"], top_n),
+        "workflows": top_counts(aggregates["workflows"], top_n),
+        "keywords": top_counts(aggregates["keywords"], top_n),
+        "errors": [
+            {"cluster": cluster, "keyword": labels[cluster][0], "signature": labels[cluster][1], "failures": count}
+            for cluster, count in top_clusters
+        ],
+        "timeline": {
+            "hourly": timeline(aggregates["hourly"], TIMELINE_HOURS),
+            "daily": timeline(aggregates["daily"], TIMELINE_DAYS)
+        }
+    }
+
+def get_stats(top_n=TOP_N):
+    with stats_lock:
+        aggregates = refresh_stats()
+        if top_n != TOP_N:
+            return stats_view(aggregates, top_n)
+        if top_n not in _stats["views"]:
+            _stats["views"][top_n] = stats_view(aggregates, top_n)
+        return _stats["views"][top_n]
+
+def save_stats():
+    with stats_lock:
+        aggregates = refresh_stats()
+        snapshot = json.dumps({"format": SNAPSHOT_FORMAT, "store_id": _stats["store_id"], "last_id": _stats["last_id"], "aggregates": dump_aggregates(aggregates)})
+        files = {
+            "workflow_stats.json": dict(aggregates["workflows"]),
+            "repo_stats.json": dict(aggregates["repos"]),
+            "error_stats.json": dict(aggregates["keywords"]),
+            "summary.json": {
+                "total_failures": aggregates["failures"],
+                "unique_repos": len(aggregates["repos"]),
+                "unique_workflows": len(aggregates["workflows"]),
+                "unique_error_types": len(aggregates["keywords"]),
+                "top_failing_repos": top_counts(aggregates["repos"], 10),
+                "top_failing_workflows": top_counts(aggregates["workflows"], 10),
+                "top_error_patterns": top_counts(aggregates["keywords"], 10)
+            }
+        }
+    
+    os.makedirs(STATS_DIR, exist_ok=True)
+    for name, data in files.items():
+        path = os.path.join(STATS_DIR, name)
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(path + ".tmp", path)
+    
+    with open(SNAPSHOT_PATH + ".tmp", "w") as f:
+        f.write(snapshot)
+    os.replace(SNAPSHOT_PATH + ".tmp", SNAPSHOT_PATH)
+
+def stats_samples():
+    with stats_lock:
+        aggregates = refresh_stats()
+        return [
+            ({"kind": "failures"}, aggregates["failures"]),
+            ({"kind": "repos"}, len(aggregates["repos"])),
+            ({"kind": "workflows"}, len(aggregates["workflows"])),
+            ({"kind": "error_clusters"}, len(aggregates["clusters"]))
+        ]
+
+register_collector("devo_corpus_size", "gauge", "Stored failures and distinct repos, workflows and error clusters", stats_samples)
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import re
+import time
+from types import SimpleNamespace
+
+FAKE_LLM_DELAY = float(os.getenv("DEVO_FAKE_LLM_DELAY", 0.02))
+
+def fake_completion(messages):
+    prompt = messages[-1]["content"]
+    section = prompt.split("Error lines from this run:", 1)[-1]
+    match = re.search(r"^- (.+)$", section, re.MULTILINE)
+    error = match.group(1) if match else "an unidentified step"
+    return (
+        f"Root cause: the run failed at `{error}`.\n"
+        "Fix: reproduce the failing step locally and correct the configuration or code it points to.\n"
+        "Solution: pin the dependency or toolchain versions involved in the failing step.\n"
+        "Prevention: you should add a pre-merge check that exercises this step.\n"
+    )
+
+def fake_tokens(text):
+    return re.findall(r"\S+\s*|\s+", text)
+
+def stream_chunk(token):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+def full_response(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+def fake_client():
+    def create(model, messages, stream=False, **kwargs):
+        text = fake_completion(messages)
+        if not stream:
+            return full_response(text)
+        
+        def chunks():
+            for token in fake_tokens(text):
+                time.sleep(FAKE_LLM_DELAY)
+                yield stream_chunk(token)
+        return chunks()
+    
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+def fake_async_client():
+    async def create(model, messages, stream=False, **kwargs):
+        text = fake_completion(messages)
+        if not stream:
+            return full_response(text)
+        
+        async def chunks():
+            for token in fake_tokens(text):
+                await asyncio.sleep(FAKE_LLM_DELAY)
+                yield stream_chunk(token)
+        return chunks()
+    
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
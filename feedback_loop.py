@@ -1,25 +1,33 @@
-import json
+import asyncio
+import os
 import time
-import schedule
 from datetime import datetime
-from ingestion import ingest_ci_failure
-from knowledge_graph import build_graph, save_graph
-from embeddings import create_document_embeddings
-from graph_rag import graph_rag_pipeline
+from bulk_ingestion import ingest_runs
+from storage import failure_exists, latest_failures
+from events import start_pipeline, stop_pipeline
 
-def collect_new_failures():
+RECENT_ANALYSIS_LIMIT = 500
+COLLECT_INTERVAL = int(os.getenv("DEVO_COLLECT_INTERVAL", 60))
+SNAPSHOT_INTERVAL = int(os.getenv("DEVO_SNAPSHOT_INTERVAL", 2 * 3600))
+
+async def collect_new_failures():
     print(f"[{datetime.now()}] Checking for new failures...")
     
     repos = ["owner/repo1", "owner/repo2"]
+    new_runs = []
     
     for repo in repos:
         recent_runs = fetch_recent_runs(repo)
         
         for run in recent_runs:
             if run['conclusion'] == 'failure':
-                if not failure_exists(run['id']):
+                if not failure_exists(run['id'], repo):
                     print(f"New failure found: {run['id']}")
-                    ingest_ci_failure(repo, run['id'], get_token())
+                    new_runs.append((repo, run['id']))
+    
+    if new_runs:
+        result = await ingest_runs(new_runs, get_token())
+        print(f"Ingested {len(result['ingested'])} failures, {len(result['failed'])} errors")
 
 def fetch_recent_runs(repo):
     return [
@@ -27,69 +35,67 @@ def fetch_recent_runs(repo):
         {"id": 12348, "conclusion": "success", "status": "completed"}
     ]
 
-def failure_exists(run_id):
-    try:
-        with open("data/failures.json", "r") as f:
-            for line in f:
-                failure = json.loads(line.strip())
-                if failure['run_id'] == run_id:
-                    return True
-    except FileNotFoundError:
-        pass
-    return False
-
 def get_token():
     import os
     return os.getenv("GITHUB_TOKEN", "fake-token")
 
 def rebuild_knowledge_graph():
-    print(f"[{datetime.now()}] Rebuilding knowledge graph...")
-    G = build_graph()
-    nodes, edges = save_graph(G)
-    print(f"Graph rebuilt: {nodes} nodes, {edges} edges")
+    from knowledge_graph import get_graph, graph_lock, save_graph
+    from shards import SHARD_COUNT
+    print(f"[{datetime.now()}] Refreshing knowledge graph...")
+    with graph_lock:
+        nodes, edges = save_graph(get_graph())
+        for shard in range(SHARD_COUNT):
+            save_graph(get_graph(shard), shard)
+    print(f"Graph refreshed: {nodes} nodes, {edges} edges")
 
 def update_embeddings():
+    from embeddings import load_indexes, save_index
     print(f"[{datetime.now()}] Updating embeddings...")
-    vectorizer, embeddings, metadata = create_document_embeddings()
-    if embeddings is not None:
-        print(f"Embeddings updated: {embeddings.shape}")
+    load_indexes()
+    count = save_index()
+    print(f"Embeddings updated: {count} indexed failures")
 
 def analyze_recent_patterns():
+    from graph_rag import graph_rag_pipeline_batch
     print(f"[{datetime.now()}] Analyzing recent failure patterns...")
     
-    recent_failures = []
-    try:
-        with open("data/failures.json", "r") as f:
-            for line in f:
-                failure = json.loads(line.strip())
-                recent_failures.append(failure)
-    except FileNotFoundError:
-        return
-    
-    if len(recent_failures) < 2:
+    recent_failures = latest_failures(RECENT_ANALYSIS_LIMIT)
+    if not recent_failures:
         return
     
-    latest_failure = recent_failures[-1]
-    analysis = graph_rag_pipeline(latest_failure['run_id'], "pattern analysis")
+    analyses = asyncio.run(graph_rag_pipeline_batch([(failure['run_id'], "pattern analysis") for failure in recent_failures]))
     
-    print(f"Latest analysis: {analysis['diagnosis'][:100]}...")
+    print(f"Analyzed {len(analyses)} recent failures")
+    print(f"Latest analysis: {analyses[0]['diagnosis'][:100]}...")
 
 def feedback_loop():
-    collect_new_failures()
+    asyncio.run(collect_new_failures())
     rebuild_knowledge_graph()
     update_embeddings()
     analyze_recent_patterns()
 
+def save_snapshots():
+    rebuild_knowledge_graph()
+    update_embeddings()
+
+async def monitor():
+    start_pipeline()
+    last_snapshot = time.monotonic()
+    try:
+        while True:
+            await collect_new_failures()
+            if time.monotonic() - last_snapshot >= SNAPSHOT_INTERVAL:
+                await asyncio.to_thread(save_snapshots)
+                last_snapshot = time.monotonic()
+            await asyncio.sleep(COLLECT_INTERVAL)
+    finally:
+        await stop_pipeline()
+        save_snapshots()
+
 def start_monitoring():
-    schedule.every(30).minutes.do(feedback_loop)
-    schedule.every(2).hours.do(rebuild_knowledge_graph)
-    schedule.every(6).hours.do(analyze_recent_patterns)
-    
     print("Starting Devo feedback loop monitoring...")
-    
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
+    asyncio.run(monitor())
 
 if __name__ == "__main__":
     start_monitoring()
@@ -25,6 +25,49 @@ async function makeRequest(url, options = {}) {
     }
 }
 
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+async function runJob(url, body) {
+    showLoading();
+    try {
+        const response = await fetch(`${API_BASE}${url}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: body ? JSON.stringify(body) : undefined
+        });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        const { job } = await response.json();
+        
+        let delay = 500;
+        while (true) {
+            await sleep(delay);
+            const poll = await fetch(`${API_BASE}/jobs/${job.job_id}/result`);
+            if (poll.status === 202) {
+                delay = Math.min(delay * 1.5, 3000);
+                continue;
+            }
+            if (!poll.ok) {
+                throw new Error(`HTTP ${poll.status}: ${poll.statusText}`);
+            }
+            const finished = await poll.json();
+            if (finished.status === 'failed') {
+                throw new Error(finished.error || 'Job failed');
+            }
+            return finished.result;
+        }
+    } catch (error) {
+        console.error('Job failed:', error);
+        showError(`Request failed: ${error.message}`);
+        throw error;
+    } finally {
+        hideLoading();
+    }
+}
+
 function showLoading() {
     document.getElementById('loadingOverlay').style.display = 'flex';
 }
@@ -50,7 +93,7 @@ async function loadStats() {
     try {
         const stats = await makeRequest('/stats');
         
-        document.getElementById('totalFailures').textContent = formatNumber(stats.nodes || 0);
+        document.getElementById('totalFailures').textContent = formatNumber(stats.failures || 0);
         document.getElementById('graphNodes').textContent = formatNumber(stats.nodes || 0);
         document.getElementById('repositories').textContent = formatNumber(stats.node_types?.repository || 0);
         document.getElementById('workflows').textContent = stats.node_types?.workflow || 0;
@@ -60,7 +103,7 @@ async function loadStats() {
     }
 }
 
-async function analyzeFailure() {
+function analyzeFailure() {
     const runId = document.getElementById('runId').value;
     const query = document.getElementById('analysisQuery').value;
     
@@ -69,20 +112,44 @@ async function analyzeFailure() {
         return;
     }
     
-    try {
-        const result = await makeRequest('/analyze', {
-            method: 'POST',
-            body: JSON.stringify({
-                run_id: parseInt(runId),
-                query: query || 'analyze failure'
-            })
-        });
-        
-        displayAnalysisResult(result);
-        
-    } catch (error) {
-        console.error('Analysis failed:', error);
-    }
+    const params = new URLSearchParams({ run_id: parseInt(runId), query: query || 'analyze failure' });
+    const source = new EventSource(`${API_BASE}/analyze/stream?${params}`);
+    const analysis = { context: null, diagnosis: '', recommendations: [] };
+    showLoading();
+    
+    source.addEventListener('context', event => {
+        analysis.context = JSON.parse(event.data);
+        hideLoading();
+        displayAnalysisResult({ analysis });
+    });
+    
+    source.addEventListener('token', event => {
+        analysis.diagnosis += JSON.parse(event.data).text;
+        document.getElementById('diagnosisText').textContent = analysis.diagnosis;
+    });
+    
+    source.addEventListener('recommendation', event => {
+        const item = document.createElement('li');
+        item.textContent = JSON.parse(event.data).text;
+        document.getElementById('recommendationList').appendChild(item);
+    });
+    
+    source.addEventListener('done', event => {
+        source.close();
+        displayAnalysisResult({ analysis: JSON.parse(event.data) });
+    });
+    
+    source.addEventListener('analysis_error', event => {
+        source.close();
+        hideLoading();
+        showError(`Analysis failed: ${JSON.parse(event.data).detail}`);
+    });
+    
+    source.onerror = () => {
+        source.close();
+        hideLoading();
+        console.error('Analysis stream closed unexpectedly');
+    };
 }
 
 function displayAnalysisResult(result) {
@@ -98,48 +165,27 @@ function displayAnalysisResult(result) {
     const analysis = result.analysis;
     let html = '';
     
-    if (analysis.diagnosis) {
-        html += `
-            <div class="diagnosis-section">
-                <h4><i class="fas fa-stethoscope"></i> Diagnosis</h4>
-                <p>${analysis.diagnosis}</p>
-            </div>
-        `;
-    }
+    html += `
+        <div class="diagnosis-section">
+            <h4><i class="fas fa-stethoscope"></i> Diagnosis</h4>
+            <p id="diagnosisText" style="white-space: pre-wrap;"></p>
+            <ul id="recommendationList"></ul>
+        </div>
+    `;
     
-    if (analysis.context?.graph_similar?.length > 0) {
+    if (analysis.context?.similar_failures?.length > 0) {
         html += `
             <div class="diagnosis-section">
-                <h4><i class="fas fa-project-diagram"></i> Similar Failures (Graph)</h4>
+                <h4><i class="fas fa-search"></i> Similar Failures</h4>
                 <div class="similar-failures">
         `;
         
-        analysis.context.graph_similar.forEach(item => {
+        analysis.context.similar_failures.forEach(item => {
             html += `
                 <div class="similar-failure">
-                    <div class="repo">Run: ${item[0]}</div>
-                    <div class="workflow">Similarity Score: ${item[1]}</div>
-                </div>
-            `;
-        });
-        
-        html += `</div></div>`;
-    }
-    
-    if (analysis.context?.vector_similar?.length > 0) {
-        html += `
-            <div class="diagnosis-section">
-                <h4><i class="fas fa-search"></i> Similar Failures (Vector)</h4>
-                <div class="similar-failures">
-        `;
-        
-        analysis.context.vector_similar.forEach(item => {
-            const metadata = item.metadata;
-            html += `
-                <div class="similar-failure">
-                    <div class="repo">${metadata.repo}</div>
-                    <div class="workflow">Workflow: ${metadata.workflow} | Similarity: ${(item.similarity * 100).toFixed(1)}%</div>
-                    <div class="error">${metadata.error_patterns?.[0]?.context || 'No error context'}</div>
+                    <div class="repo">${item.repo || 'Run ' + item.run_id}</div>
+                    <div class="workflow">Workflow: ${item.workflow || 'unknown'} | Graph: ${(item.graph_score * 100).toFixed(0)}% | Vector: ${(item.vector_score * 100).toFixed(1)}%</div>
+                    <div class="error">${item.errors?.[0] || 'No error context'}</div>
                 </div>
             `;
         });
@@ -167,7 +213,13 @@ function displayAnalysisResult(result) {
         html += `</div></div>`;
     }
     
-    content.innerHTML = html || '<p>No detailed analysis available</p>';
+    content.innerHTML = html;
+    document.getElementById('diagnosisText').textContent = analysis.diagnosis || '';
+    (analysis.recommendations || []).forEach(text => {
+        const item = document.createElement('li');
+        item.textContent = text;
+        document.getElementById('recommendationList').appendChild(item);
+    });
     container.style.display = 'block';
 }
 
@@ -247,11 +299,11 @@ async function refreshSystemStatus() {
                 cpuText.textContent = `${runtime.cpu_percent}%`;
             }
             
-            if (runtime.memory_percent !== undefined) {
+            if (runtime.memory && runtime.memory.percent !== undefined) {
                 const memoryProgress = document.getElementById('memoryProgress');
                 const memoryText = document.getElementById('memoryText');
-                memoryProgress.style.width = `${runtime.memory_percent}%`;
-                memoryText.textContent = `${runtime.memory_percent}%`;
+                memoryProgress.style.width = `${runtime.memory.percent}%`;
+                memoryText.textContent = `${runtime.memory.percent}%`;
             }
             
         } catch (error) {
@@ -272,9 +324,7 @@ async function rebuildGraph() {
     }
     
     try {
-        const result = await makeRequest('/build-graph', {
-            method: 'POST'
-        });
+        const result = await runJob('/jobs/build-graph');
         
         alert(`Knowledge graph rebuilt successfully!\nNodes: ${result.nodes}\nEdges: ${result.edges}`);
         loadStats(); // Refresh stats
@@ -1,10 +1,32 @@
+import asyncio
 import json
 import os
-from openai import OpenAI
-from knowledge_graph import build_graph, find_similar_failures, get_failure_path
-from embeddings import create_document_embeddings, search_similar_failures, extract_relevant_context
+from openai import AsyncOpenAI, OpenAI
+from fake_llm import fake_async_client, fake_client
+from knowledge_graph import graph_context, graph_context_batch, merge_graph_contexts, record_probe, shard_graph_context, shard_overlaps
+from embeddings import merge_hits, search_index, search_shard, shard_similarities, extract_relevant_context
+from workers import run_io, scatter
+from shards import target_shards
+from diagnosis_cache import fingerprint, get_cached_diagnosis, put_cached_diagnosis
+from metrics import inc, timer
+from retrieval import RETRIEVAL_CANDIDATES, fuse_results, load_records, merge_scores, missing_candidates, missing_records, retrieve, summarize_results
+
+LLM_MODEL = "gpt-3.5-turbo"
+LLM_SYSTEM_PROMPT = "You are a CI/CD failure analysis expert."
+LLM_CONCURRENCY = int(os.getenv("DEVO_LLM_CONCURRENCY", 8))
+PROMPT_TOKEN_BUDGET = int(os.getenv("DEVO_PROMPT_TOKEN_BUDGET", 1500))
+TARGET_BUDGET_SHARE = 0.6
+CHARS_PER_TOKEN = 4
+MAX_LINE_CHARS = 300
+MAX_RECOMMENDATIONS = 5
+RECOMMENDATION_MARKERS = ['fix:', 'solution:', 'recommend', 'should', 'try']
+FAKE_LLM = os.getenv("DEVO_FAKE_LLM", "0") == "1"
+
+_async_llm = {"client": None}
 
 def init_llm():
+    if FAKE_LLM:
+        return fake_client()
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         return None
@@ -13,40 +35,122 @@ def init_llm():
     except Exception:
         return None
 
-def analyze_failure(run_id, query="build failure analysis"):
-    G = build_graph()
-    vectorizer, embeddings, doc_metadata = create_document_embeddings()
-    
-    graph_similar = find_similar_failures(G, run_id)[:3]
-    vector_similar = search_similar_failures(query, vectorizer, embeddings, doc_metadata, 3)
-    
-    failure_path = get_failure_path(G, run_id)
+def init_async_llm():
+    if _async_llm["client"] is None and FAKE_LLM:
+        _async_llm["client"] = fake_async_client()
+    if _async_llm["client"] is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            return None
+        try:
+            _async_llm["client"] = AsyncOpenAI(api_key=api_key)
+        except Exception:
+            return None
+    return _async_llm["client"]
+
+def analyze_failure(run_id, query="build failure analysis", since=None):
+    vector_similar = search_index(query, RETRIEVAL_CANDIDATES, since)
+    graph = graph_context(run_id, RETRIEVAL_CANDIDATES, since)
+    target = load_records([run_id])[run_id]
+    runs, run_nodes = missing_candidates(graph["graph_similar"], vector_similar, run_id)
+    shards = target_shards()
+    vector_scores = merge_scores([shard_similarities(shard, [(query, runs)]) for shard in shards])[0]
+    graph_scores = merge_scores([shard_overlaps(shard, [(record_probe(target), run_nodes, graph["graph_measure"])]) for shard in shards])[0]
+    similar = retrieve(graph["graph_similar"], vector_similar, run_id, graph_scores=graph_scores, vector_scores=vector_scores)
+    return build_context(run_id, graph, similar, target_lines(target, query), target)
+
+async def analyze_failure_async(run_id, query="build failure analysis", since=None):
+    return (await analyze_failures_async([(run_id, query)], since))[0]
+
+async def analyze_failures_async(items, since=None):
+    run_ids = list(dict.fromkeys(run_id for run_id, _ in items))
+    targets = await run_io(load_records, run_ids)
+    probes = {run_id: record_probe(targets[run_id]) for run_id in run_ids}
+    shards = target_shards()
+    vector_parts, graph_parts = await asyncio.gather(
+        scatter(search_shard, shards, [query for _, query in items], RETRIEVAL_CANDIDATES, since),
+        scatter(shard_graph_context, shards, probes, RETRIEVAL_CANDIDATES, since)
+    )
+    vector_similar = merge_hits(vector_parts, RETRIEVAL_CANDIDATES)
+    graph = merge_graph_contexts(run_ids, graph_parts, RETRIEVAL_CANDIDATES)
     
+    missing = [missing_candidates(graph[run_id]["graph_similar"], similar, run_id) for (run_id, _), similar in zip(items, vector_similar)]
+    vector_parts, graph_parts = await asyncio.gather(
+        scatter(shard_similarities, shards, [(query, runs) for (_, query), (runs, _) in zip(items, missing)]),
+        scatter(shard_overlaps, shards, [(probes[run_id], run_nodes, graph[run_id]["graph_measure"]) for (run_id, _), (_, run_nodes) in zip(items, missing)])
+    )
+    fused = [
+        fuse_results(graph[run_id]["graph_similar"], similar, run_id, graph_scores=graph_scores, vector_scores=vector_scores)
+        for (run_id, _), similar, graph_scores, vector_scores in zip(items, vector_similar, merge_scores(graph_parts), merge_scores(vector_parts))
+    ]
+    records = {**targets, **await run_io(load_records, missing_records(fused) - set(targets))}
+    error_lines = await run_io(target_lines_many, [(records[run_id], query) for run_id, query in items])
+    return [
+        build_context(run_id, graph[run_id], summarize_results(hits, records), lines, records[run_id])
+        for (run_id, query), hits, lines in zip(items, fused, error_lines)
+    ]
+
+def target_lines(failure, query):
+    return extract_relevant_context(failure, query) if failure else []
+
+def target_lines_many(items):
+    return [target_lines(failure, query) for failure, query in items]
+
+def build_context(run_id, graph, similar_failures, error_lines=None, target=None):
     context = {
         "target_run": run_id,
-        "graph_similar": graph_similar,
-        "vector_similar": vector_similar,
-        "failure_path": failure_path
+        "repo": target["repo"] if target else None,
+        "error_lines": error_lines or [],
+        "similar_failures": similar_failures,
+        "failure_path": graph["failure_path"]
     }
     
     return context
 
-def generate_diagnosis(context, query):
-    client = init_llm()
-    if not client:
-        return f"Mock diagnosis: Based on the error patterns and similar failures, this appears to be a {query} related issue. Common causes include dependency conflicts, build configuration errors, or environment setup problems."
-    if not client:
-        return "LLM not available - set OPENAI_API_KEY"
+def mock_diagnosis(query):
+    return f"Mock diagnosis: Based on the error patterns and similar failures, this appears to be a {query} related issue. Common causes include dependency conflicts, build configuration errors, or environment setup problems."
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def pack_lines(lines, budget):
+    packed = []
+    for line in lines:
+        line = line if len(line) <= MAX_LINE_CHARS else line[:MAX_LINE_CHARS] + "..."
+        cost = estimate_tokens(line) + 1
+        if cost > budget:
+            continue
+        packed.append(f"- {line}")
+        budget -= cost
+    return packed, budget
+
+def similar_failure_line(hit):
+    return f"run {hit['run_id']} ({hit['repo']}, {hit['workflow']}, graph {hit['graph_score']:.2f}, vector {hit['vector_score']:.2f}): {'; '.join(hit['errors'])}"
+
+def path_summary(context):
+    names = {node.get('type'): node.get('name') for node in context['failure_path'] if node.get('name')}
+    if context.get('repo'):
+        names['repository'] = context['repo']
+    return ", ".join(f"{kind} {names[kind]}" for kind in ("repository", "workflow") if kind in names)
+
+def build_prompt(context, query, budget=PROMPT_TOKEN_BUDGET):
+    error_lines = list(context.get('error_lines', []))
+    error_lines += [node['context'] for node in context['failure_path'] if node.get('type') == 'error' and node.get('context')]
+    
+    target, remaining = pack_lines(dict.fromkeys(error_lines), int(budget * TARGET_BUDGET_SHARE))
+    similar, _ = pack_lines([similar_failure_line(hit) for hit in context['similar_failures']], budget - int(budget * TARGET_BUDGET_SHARE) + remaining)
     
-    prompt = f"""
+    return f"""
 Analyze this CI/CD failure:
 
-Target Run: {context['target_run']}
+Target Run: {context['target_run']} ({path_summary(context) or 'unknown source'})
 Query: {query}
 
-Similar failures from graph: {context['graph_similar']}
-Similar failures from vector search: {context['vector_similar']}
-Failure path: {context['failure_path']}
+Error lines from this run:
+{chr(10).join(target) or '- none captured'}
+
+Similar failures:
+{chr(10).join(similar) or '- none found'}
 
 Provide:
 1. Root cause analysis
@@ -56,45 +160,199 @@ Provide:
 Keep response concise and actionable.
 """
 
+def llm_messages(context, query):
+    return [
+        {"role": "system", "content": LLM_SYSTEM_PROMPT},
+        {"role": "user", "content": build_prompt(context, query)}
+    ]
+
+def generate_diagnosis(context, query):
+    client = init_llm()
+    if not client:
+        return mock_diagnosis(query)
+    
+    key = fingerprint(context, query)
+    cached = get_cached_diagnosis(key)
+    if cached is not None:
+        inc("devo_llm_requests_total", mode="sync", outcome="cache_hit")
+        return cached
+    
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a CI/CD failure analysis expert."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.1
-        )
-        return response.choices[0].message.content
+        with timer("devo_llm_request_duration_seconds", mode="sync"):
+            response = client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=llm_messages(context, query),
+                max_tokens=500,
+                temperature=0.1
+            )
+        diagnosis = response.choices[0].message.content
     except Exception as e:
+        inc("devo_llm_requests_total", mode="sync", outcome="error")
         return f"LLM error: {str(e)}"
+    
+    inc("devo_llm_requests_total", mode="sync", outcome="ok")
+    put_cached_diagnosis(key, diagnosis)
+    return diagnosis
 
-def graph_rag_pipeline(run_id, query="analyze ci failure"):
-    context = analyze_failure(run_id, query)
-    diagnosis = generate_diagnosis(context, query)
+async def generate_diagnosis_async(context, query):
+    client = init_async_llm()
+    if not client:
+        return mock_diagnosis(query)
+    
+    key = fingerprint(context, query)
+    cached = get_cached_diagnosis(key)
+    if cached is not None:
+        inc("devo_llm_requests_total", mode="async", outcome="cache_hit")
+        return cached
+    
+    try:
+        with timer("devo_llm_request_duration_seconds", mode="async"):
+            response = await client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=llm_messages(context, query),
+                max_tokens=500,
+                temperature=0.1
+            )
+        diagnosis = response.choices[0].message.content
+    except Exception as e:
+        inc("devo_llm_requests_total", mode="async", outcome="error")
+        return f"LLM error: {str(e)}"
+    
+    inc("devo_llm_requests_total", mode="async", outcome="ok")
+    await run_io(put_cached_diagnosis, key, diagnosis)
+    return diagnosis
+
+async def generate_diagnoses_async(contexts, queries):
+    slots = asyncio.Semaphore(LLM_CONCURRENCY)
+    
+    async def generate(context, query):
+        async with slots:
+            return await generate_diagnosis_async(context, query)
+    
+    tasks = {}
+    keys = []
+    for context, query in zip(contexts, queries):
+        key = fingerprint(context, query)
+        if key not in tasks:
+            tasks[key] = asyncio.ensure_future(generate(context, query))
+        keys.append(key)
+    
+    await asyncio.gather(*tasks.values())
+    return [tasks[key].result() for key in keys]
+
+async def stream_diagnosis_async(context, query):
+    client = init_async_llm()
+    if not client:
+        yield mock_diagnosis(query)
+        return
+    
+    key = fingerprint(context, query)
+    cached = get_cached_diagnosis(key)
+    if cached is not None:
+        inc("devo_llm_requests_total", mode="stream", outcome="cache_hit")
+        yield cached
+        return
     
-    result = {
+    parts = []
+    try:
+        with timer("devo_llm_request_duration_seconds", mode="stream"):
+            stream = await client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=llm_messages(context, query),
+                max_tokens=500,
+                temperature=0.1,
+                stream=True
+            )
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    parts.append(text)
+                    yield text
+    except Exception as e:
+        inc("devo_llm_requests_total", mode="stream", outcome="error")
+        yield f"LLM error: {str(e)}"
+        return
+    
+    inc("devo_llm_requests_total", mode="stream", outcome="ok")
+    await run_io(put_cached_diagnosis, key, "".join(parts))
+
+def build_result(run_id, query, context, diagnosis):
+    return {
         "run_id": run_id,
         "query": query,
         "context": context,
         "diagnosis": diagnosis,
         "recommendations": extract_recommendations(diagnosis)
     }
+
+def graph_rag_pipeline(run_id, query="analyze ci failure", since=None):
+    context = analyze_failure(run_id, query, since)
+    diagnosis = generate_diagnosis(context, query)
+    
+    result = build_result(run_id, query, context, diagnosis)
     
     save_analysis(result)
     return result
 
+async def graph_rag_pipeline_async(run_id, query="analyze ci failure", since=None):
+    context = await analyze_failure_async(run_id, query, since)
+    diagnosis = await generate_diagnosis_async(context, query)
+    
+    result = build_result(run_id, query, context, diagnosis)
+    
+    await run_io(save_analysis, result)
+    return result
+
+async def graph_rag_pipeline_batch(items, since=None):
+    contexts = await analyze_failures_async(items, since)
+    diagnoses = await generate_diagnoses_async(contexts, [query for _, query in items])
+    
+    results = [
+        build_result(run_id, query, context, diagnosis)
+        for (run_id, query), context, diagnosis in zip(items, contexts, diagnoses)
+    ]
+    
+    await run_io(save_analyses, results)
+    return results
+
+async def graph_rag_stream(run_id, query="analyze ci failure", since=None):
+    context = await analyze_failure_async(run_id, query, since)
+    yield "context", context
+    
+    parts = []
+    pending = ""
+    recommendations = 0
+    async for text in stream_diagnosis_async(context, query):
+        parts.append(text)
+        yield "token", {"text": text}
+        
+        *lines, pending = (pending + text).split('\n')
+        for line in lines:
+            line = line.strip()
+            if recommendations < MAX_RECOMMENDATIONS and is_recommendation(line):
+                recommendations += 1
+                yield "recommendation", {"text": line}
+    
+    if recommendations < MAX_RECOMMENDATIONS and is_recommendation(pending.strip()):
+        yield "recommendation", {"text": pending.strip()}
+    
+    result = build_result(run_id, query, context, "".join(parts))
+    await run_io(save_analysis, result)
+    yield "done", result
+
+def is_recommendation(line):
+    return any(keyword in line.lower() for keyword in RECOMMENDATION_MARKERS)
+
 def extract_recommendations(diagnosis):
     recommendations = []
     lines = diagnosis.split('\n')
     
     for line in lines:
         line = line.strip()
-        if any(keyword in line.lower() for keyword in ['fix:', 'solution:', 'recommend', 'should', 'try']):
+        if is_recommendation(line):
             recommendations.append(line)
     
-    return recommendations[:5]
+    return recommendations[:MAX_RECOMMENDATIONS]
 
 def save_analysis(result):
     os.makedirs("data", exist_ok=True)
@@ -102,24 +360,30 @@ def save_analysis(result):
     with open(filename, "w") as f:
         json.dump(result, f, indent=2)
 
-def query_knowledge_graph(query, top_k=5):
-    vectorizer, embeddings, doc_metadata = create_document_embeddings()
-    results = search_similar_failures(query, vectorizer, embeddings, doc_metadata, top_k)
-    
-    G = build_graph()
+def save_analyses(results):
+    for result in results:
+        save_analysis(result)
+
+def enhance_results(results, graph):
     enhanced_results = []
     
     for result in results:
-        run_id = result['metadata']['run_id']
-        similar = find_similar_failures(G, run_id)
-        path = get_failure_path(G, run_id)
-        
         enhanced_results.append({
             **result,
-            "graph_context": {
-                "similar_runs": similar,
-                "failure_path": path
-            }
+            "graph_context": graph[result['metadata']['run_id']]
         })
     
     return enhanced_results
+
+def query_knowledge_graph(query, top_k=5, since=None, repo=None):
+    results = search_index(query, top_k, since, repo)
+    records = {result['metadata']['run_id']: result['metadata'] for result in results}
+    graph = graph_context_batch(list(records), 10, since, repo, records)
+    return enhance_results(results, graph)
+
+async def query_knowledge_graph_async(query, top_k=5, since=None, repo=None):
+    shards = target_shards(repo)
+    results = merge_hits(await scatter(search_shard, shards, [query], top_k, since, repo), top_k)[0]
+    probes = {result['metadata']['run_id']: record_probe(result['metadata']) for result in results}
+    graph = merge_graph_contexts(list(probes), await scatter(shard_graph_context, shards, probes, 10, since, repo, False), 10, False)
+    return enhance_results(results, graph)
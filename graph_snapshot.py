@@ -0,0 +1,82 @@
+import json
+import os
+import networkx as nx
+import numpy as np
+
+SNAPSHOT_DIR = "data/graph"
+
+def pack_strings(values):
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def unpack_strings(data, offsets):
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+def save_snapshot(G, meta, path=SNAPSHOT_DIR):
+    os.makedirs(path, exist_ok=True)
+    node_ids = list(G.nodes())
+    positions = {node: i for i, node in enumerate(node_ids)}
+    
+    attributes = sorted({key for _, data in G.nodes(data=True) for key in data})
+    relations = sorted({data.get("relation", "") for _, _, data in G.edges(data=True)})
+    relation_codes = {relation: code for code, relation in enumerate(relations)}
+    
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    indices = np.zeros(G.number_of_edges(), dtype=np.int32)
+    edge_relations = np.zeros(G.number_of_edges(), dtype=np.uint8)
+    edge = 0
+    for i, node in enumerate(node_ids):
+        for succ, data in G.adj[node].items():
+            indices[edge] = positions[succ]
+            edge_relations[edge] = relation_codes[data.get("relation", "")]
+            edge += 1
+        indptr[i + 1] = edge
+    
+    arrays = {"indptr": indptr, "indices": indices, "edge_relations": edge_relations}
+    arrays["node_ids"], arrays["node_offsets"] = pack_strings(node_ids)
+    for i, key in enumerate(attributes):
+        values = [G.nodes[node].get(key) for node in node_ids]
+        arrays[f"attr{i}_present"] = np.array([value is not None for value in values], dtype=bool)
+        arrays[f"attr{i}_data"], arrays[f"attr{i}_offsets"] = pack_strings([str(value) for value in values if value is not None])
+    
+    with open(os.path.join(path, "graph.tmp.npz"), "wb") as f:
+        np.savez(f, **arrays)
+    with open(os.path.join(path, "graph.json.tmp"), "w") as f:
+        json.dump({**meta, "attributes": attributes, "relations": relations, "nodes": len(node_ids), "edges": len(indices)}, f)
+    os.replace(os.path.join(path, "graph.tmp.npz"), os.path.join(path, "graph.npz"))
+    os.replace(os.path.join(path, "graph.json.tmp"), os.path.join(path, "graph.json"))
+    return len(node_ids), len(indices)
+
+def load_snapshot_meta(path=SNAPSHOT_DIR):
+    meta_path = os.path.join(path, "graph.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        return json.load(f)
+
+def load_snapshot(path=SNAPSHOT_DIR):
+    meta = load_snapshot_meta(path)
+    if meta is None:
+        return None, None
+    
+    with np.load(os.path.join(path, "graph.npz")) as data:
+        node_ids = unpack_strings(data["node_ids"], data["node_offsets"])
+        node_attrs = [{} for _ in node_ids]
+        for i, key in enumerate(meta["attributes"]):
+            present = np.flatnonzero(data[f"attr{i}_present"])
+            for node, value in zip(present, unpack_strings(data[f"attr{i}_data"], data[f"attr{i}_offsets"])):
+                node_attrs[node][key] = value
+        indptr, indices, edge_relations = data["indptr"], data["indices"], data["edge_relations"]
+    
+    G = nx.DiGraph()
+    G.add_nodes_from(zip(node_ids, node_attrs))
+    sources = np.repeat(np.arange(len(node_ids)), np.diff(indptr))
+    relations = meta["relations"]
+    G.add_edges_from(
+        (node_ids[u], node_ids[v], {"relation": relations[r]} if relations[r] else {})
+        for u, v, r in zip(sources.tolist(), indices.tolist(), edge_relations.tolist())
+    )
+    return G, meta
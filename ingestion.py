@@ -1,7 +1,21 @@
-import json
+import io
+import re
 import requests
+import tempfile
+import zipfile
 from datetime import datetime
-import os
+from collections import deque
+from itertools import islice
+from log_store import logged_lines
+from storage import failure_exists, insert_failures
+from events import publish
+from metrics import inc, timed
+
+ERROR_KEYWORDS = ["error", "failed", "exception", "traceback", "fatal", "npm err", "build failed"]
+ERROR_MATCHER = re.compile("|".join(re.escape(k) for k in ERROR_KEYWORDS), re.IGNORECASE)
+ERROR_SCANNER = re.compile("(?=(" + "|".join(re.escape(k) for k in ERROR_KEYWORDS) + "))", re.IGNORECASE)
+LOG_CHUNK_SIZE = 1024 * 1024
+MAX_ERROR_PATTERNS = 1000
 
 def fetch_github_run(repo, run_id, token):
     url = f"https://api.github.com/repos/{repo}/actions/runs/{run_id}"
@@ -12,33 +26,61 @@ def fetch_github_run(repo, run_id, token):
 def fetch_github_logs(repo, run_id, token):
     url = f"https://api.github.com/repos/{repo}/actions/runs/{run_id}/logs"
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(url, headers=headers)
-    return response.content if response.status_code == 200 else b""
+    spool = tempfile.TemporaryFile()
+    with requests.get(url, headers=headers, stream=True) as response:
+        if response.status_code == 200:
+            for chunk in response.iter_content(chunk_size=LOG_CHUNK_SIZE):
+                spool.write(chunk)
+    spool.seek(0)
+    return spool
 
-def extract_error_patterns(log_content):
-    if isinstance(log_content, bytes):
-        log_content = log_content.decode('utf-8', errors='ignore')
+def iter_log_lines(log_file):
+    if zipfile.is_zipfile(log_file):
+        with zipfile.ZipFile(log_file) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+                with archive.open(member) as f:
+                    for raw in f:
+                        yield raw.decode('utf-8', errors='ignore').rstrip('\r\n')
+        return
     
-    error_keywords = ["error", "failed", "exception", "traceback", "fatal", "npm err", "build failed"]
-    patterns = []
-    
-    for line in log_content.split('\n'):
-        line_lower = line.lower()
-        for keyword in error_keywords:
-            if keyword in line_lower:
-                patterns.append({
+    log_file.seek(0)
+    for raw in log_file:
+        yield raw.decode('utf-8', errors='ignore').rstrip('\r\n')
+
+def iter_error_patterns(lines):
+    for line_no, line in enumerate(lines):
+        if not ERROR_MATCHER.search(line):
+            continue
+        found = {match.group(1).lower() for match in ERROR_SCANNER.finditer(line)}
+        for keyword in ERROR_KEYWORDS:
+            if keyword in found:
+                yield {
                     "keyword": keyword,
                     "line": line.strip(),
-                    "context": line[:200]
-                })
+                    "context": line[:200],
+                    "line_no": line_no
+                }
+
+def extract_error_patterns(log_content):
+    if isinstance(log_content, str):
+        return list(iter_error_patterns(log_content.split('\n')))
     
-    return patterns
+    if isinstance(log_content, bytes):
+        log_content = io.BytesIO(log_content)
+    
+    return list(iter_error_patterns(iter_log_lines(log_content)))
 
-def ingest_ci_failure(repo, run_id, token):
-    run_data = fetch_github_run(repo, run_id, token)
-    logs = fetch_github_logs(repo, run_id, token)
+@timed("parse_logs")
+def build_failure_record(repo, run_id, run_data, logs):
+    lines = iter_log_lines(logs)
+    if not failure_exists(run_id, repo):
+        lines = logged_lines(repo, run_id, lines)
+    error_patterns = list(islice(iter_error_patterns(lines), MAX_ERROR_PATTERNS))
+    deque(lines, maxlen=0)
     
-    processed = {
+    return {
         "run_id": run_id,
         "repo": repo,
         "status": run_data.get("status"),
@@ -46,12 +88,22 @@ def ingest_ci_failure(repo, run_id, token):
         "workflow": run_data.get("name"),
         "commit": run_data.get("head_sha"),
         "timestamp": datetime.now().isoformat(),
-        "error_patterns": extract_error_patterns(logs),
-        "raw_logs": logs.decode('utf-8', errors='ignore')[:5000] if logs else ""
+        "error_patterns": error_patterns
     }
+
+@timed("ingest")
+def save_failures(records):
+    inserted = insert_failures(records)
+    if inserted:
+        inc("devo_stage_items_total", inserted, stage="ingest")
+        publish(records)
+    return inserted
+
+def ingest_ci_failure(repo, run_id, token):
+    run_data = fetch_github_run(repo, run_id, token)
     
-    os.makedirs("data", exist_ok=True)
-    with open("data/failures.json", "a") as f:
-        f.write(json.dumps(processed) + "\n")
+    with fetch_github_logs(repo, run_id, token) as logs:
+        processed = build_failure_record(repo, run_id, run_data, logs)
     
+    save_failures([processed])
     return processed
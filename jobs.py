@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+
+MAX_RUNNING_JOBS = int(os.getenv("DEVO_MAX_RUNNING_JOBS", 4))
+MAX_QUEUED_JOBS = int(os.getenv("DEVO_MAX_QUEUED_JOBS", 256))
+JOB_TTL = int(os.getenv("DEVO_JOB_TTL", 3600))
+MAX_FINISHED_JOBS = 1000
+
+_jobs = {}
+_tasks = {}
+_inflight = {}
+_state = {"slots": None}
+
+def job_key(kind, params):
+    return hashlib.sha1(json.dumps([kind, params], sort_keys=True).encode("utf-8")).hexdigest()
+
+def job_view(job, with_result=False):
+    view = {k: v for k, v in job.items() if k != "result"}
+    if with_result:
+        view["result"] = job["result"]
+    return view
+
+def queued_jobs():
+    return sum(1 for job in _jobs.values() if job["status"] == "queued")
+
+def submit_job(kind, params, fn):
+    key = job_key(kind, params)
+    if key in _inflight:
+        return _jobs[_inflight[key]]
+    
+    if queued_jobs() >= MAX_QUEUED_JOBS:
+        return None
+    
+    if _state["slots"] is None:
+        _state["slots"] = asyncio.Semaphore(MAX_RUNNING_JOBS)
+    
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "kind": kind,
+        "params": params,
+        "status": "queued",
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "error": None,
+        "result": None
+    }
+    _jobs[job["job_id"]] = job
+    _inflight[key] = job["job_id"]
+    _tasks[job["job_id"]] = asyncio.create_task(run_job(job, key, fn))
+    
+    prune_jobs()
+    return job
+
+async def run_job(job, key, fn):
+    try:
+        async with _state["slots"]:
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            job["result"] = await fn()
+            job["status"] = "succeeded"
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = time.time()
+        _inflight.pop(key, None)
+        _tasks.pop(job["job_id"], None)
+
+def get_job(job_id):
+    return _jobs.get(job_id)
+
+def prune_jobs():
+    now = time.time()
+    finished = [job for job in _jobs.values() if job["finished_at"] is not None]
+    expired = {job["job_id"] for job in finished if now - job["finished_at"] > JOB_TTL}
+    
+    overflow = len(finished) - len(expired) - MAX_FINISHED_JOBS
+    if overflow > 0:
+        remaining = sorted((job for job in finished if job["job_id"] not in expired), key=lambda job: job["finished_at"])
+        expired.update(job["job_id"] for job in remaining[:overflow])
+    
+    for job_id in expired:
+        _jobs.pop(job_id, None)
+
+async def cancel_jobs():
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
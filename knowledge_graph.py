@@ -1,57 +1,228 @@
+import bisect
+import heapq
+import itertools
 import json
 import networkx as nx
 import os
+import threading
+from collections import Counter
+from storage import bump_graph_generation, get_failure, graph_generation, load_failures, read_new_failures, rollup_signatures, store_version
+from doc_table import parse_timestamp
+from graph_snapshot import SNAPSHOT_DIR, load_snapshot, save_snapshot
+from metrics import inc, stage_timer
+from shards import SHARD_LAYOUT, shard_dir, target_shards
 
-def load_failures():
-    failures = []
-    if os.path.exists("data/failures.json"):
-        with open("data/failures.json", "r") as f:
-            for line in f:
-                failures.append(json.loads(line.strip()))
-    return failures
-
-def build_graph():
-    G = nx.DiGraph()
-    failures = load_failures()
+EXPORT_FORMATS = {"gexf": "data/knowledge_graph.gexf", "json": "data/knowledge_graph.json"}
+GRAPH_PAGE_SIZE = 500
+GRAPH_PAGE_EDGES = 5000
+GRAPH_FORMAT = 3
+
+graph_lock = threading.RLock()
+_stores = {}
+
+def add_node(G, node, **attrs):
+    nodes = G.graph.get("sorted_nodes")
+    if nodes is not None and node not in G:
+        bisect.insort(nodes, node)
+    G.add_node(node, **attrs)
+
+def add_failure(G, failure):
+    repo_id = f"repo_{failure['repo'].replace('/', '_')}"
+    workflow_id = f"workflow_{failure['workflow']}"
+    run_id = f"run_{failure['run_id']}"
     
-    for failure in failures:
-        repo_id = f"repo_{failure['repo'].replace('/', '_')}"
-        workflow_id = f"workflow_{failure['workflow']}"
-        run_id = f"run_{failure['run_id']}"
-        
-        G.add_node(repo_id, type="repository", name=failure['repo'])
-        G.add_node(workflow_id, type="workflow", name=failure['workflow'])
-        G.add_node(run_id, type="run", status=failure['status'], conclusion=failure['conclusion'])
-        
-        G.add_edge(repo_id, workflow_id, relation="contains")
-        G.add_edge(workflow_id, run_id, relation="executed")
-        
-        for pattern in failure['error_patterns']:
-            error_id = f"error_{pattern['keyword']}_{failure['run_id']}"
-            G.add_node(error_id, type="error", keyword=pattern['keyword'], context=pattern['context'])
-            G.add_edge(run_id, error_id, relation="produced")
+    add_node(G, repo_id, type="repository", name=failure['repo'])
+    add_node(G, workflow_id, type="workflow", name=failure['workflow'])
+    add_node(G, run_id, type="run", status=failure['status'], conclusion=failure['conclusion'], repo=failure['repo'], timestamp=failure.get('timestamp'))
+    
+    G.add_edge(repo_id, workflow_id, relation="contains")
+    G.add_edge(workflow_id, run_id, relation="executed")
     
+    for pattern in failure['error_patterns']:
+        error_id = error_node_id(pattern, failure['run_id'])
+        if 'cluster' not in pattern:
+            add_node(G, error_id, type="error", keyword=pattern['keyword'], context=pattern['context'])
+        elif error_id not in G:
+            add_node(G, error_id, type="error", keyword=pattern['keyword'], context=pattern['context'], signature=pattern['signature'])
+        G.add_edge(run_id, error_id, relation="produced")
+        index_keyword(G, run_id, pattern['keyword'])
+
+def error_node_id(pattern, run_id):
+    return f"error_{pattern['cluster']}" if 'cluster' in pattern else f"error_{pattern['keyword']}_{run_id}"
+
+def add_rollups(G, rollups):
+    for repo, workflow, error, keyword, signature, context, failures in rollups:
+        repo_id = f"repo_{repo.replace('/', '_')}"
+        workflow_id = f"workflow_{workflow}"
+        error_id = f"error_{error}"
+        G.add_node(repo_id, type="repository", name=repo)
+        G.add_node(workflow_id, type="workflow", name=workflow)
+        if error_id not in G:
+            G.add_node(error_id, type="error", keyword=keyword, context=context, signature=signature)
+        G.nodes[error_id]["compacted_runs"] = int(G.nodes[error_id].get("compacted_runs", 0)) + failures
+        G.add_edge(repo_id, workflow_id, relation="contains")
+        G.add_edge(workflow_id, error_id, relation="rolled_up")
     return G
 
-def find_similar_failures(G, target_run_id):
-    target_node = f"run_{target_run_id}"
-    if target_node not in G:
-        return []
-    
-    target_errors = [n for n in G.successors(target_node) if G.nodes[n]['type'] == 'error']
-    target_keywords = {G.nodes[e]['keyword'] for e in target_errors}
+def new_graph(shard=None):
+    return add_rollups(nx.DiGraph(), rollup_signatures(shard))
+
+def run_filter(G, since=None, repo=None):
+    if since is None and repo is None:
+        return None
     
-    similar_runs = []
-    for node in G.nodes():
-        if G.nodes[node]['type'] == 'run' and node != target_node:
-            run_errors = [n for n in G.successors(node) if G.nodes[n]['type'] == 'error']
-            run_keywords = {G.nodes[e]['keyword'] for e in run_errors}
-            
-            overlap = len(target_keywords.intersection(run_keywords))
-            if overlap > 0:
-                similar_runs.append((node, overlap))
+    since_ts = None if since is None else parse_timestamp(since)
     
-    return sorted(similar_runs, key=lambda x: x[1], reverse=True)
+    def accept(run_node):
+        data = G.nodes[run_node]
+        return (since_ts is None or parse_timestamp(data.get('timestamp')) >= since_ts) and (repo is None or data.get('repo') == repo)
+    return accept
+
+def graph_store(shard):
+    if shard not in _stores:
+        _stores[shard] = {"graph": None, "store_id": None, "last_id": 0, "use_snapshot": True, "generation": None}
+    return _stores[shard]
+
+def snapshot_path(shard):
+    return SNAPSHOT_DIR if shard is None else shard_dir(SNAPSHOT_DIR, shard)
+
+def index_keyword(G, run_node, keyword):
+    G.graph.setdefault("keyword_runs", {}).setdefault(keyword, {})[run_node] = None
+    G.graph.setdefault("run_keywords", {}).setdefault(run_node, set()).add(keyword)
+
+def keyword_index(G):
+    if "keyword_runs" not in G.graph:
+        G.graph["keyword_runs"] = {}
+        G.graph["run_keywords"] = {}
+        for node, data in G.nodes(data=True):
+            if data.get('type') == 'run':
+                for succ in G.successors(node):
+                    if G.nodes[succ].get('type') == 'error':
+                        index_keyword(G, node, G.nodes[succ]['keyword'])
+    return G.graph["keyword_runs"], G.graph["run_keywords"]
+
+def top_counts(items, top_k=None):
+    if top_k is None:
+        return sorted(items, key=lambda x: (-x[1], x[0]))
+    return heapq.nsmallest(top_k, items, key=lambda x: (-x[1], x[0]))
+
+def rank_keyword_overlap(keyword_runs, keywords, top_k=None, accept=None):
+    counts = Counter()
+    for keyword in keywords:
+        runs = keyword_runs.get(keyword, {}).keys()
+        counts.update(runs if accept is None else filter(accept, runs))
+    return top_counts(counts.items(), top_k)
+
+def build_graph(shard=None):
+    G = new_graph(shard)
+    for failure in load_failures(shard):
+        add_failure(G, failure)
+    return G
+
+def load_saved_graph(shard, store_id, last_id):
+    try:
+        G, meta = load_snapshot(snapshot_path(shard))
+    except (OSError, ValueError, KeyError):
+        return None
+    if G is None or meta.get("format") != GRAPH_FORMAT or meta.get("store_id") != store_id or meta.get("last_id", 0) > last_id:
+        return None
+    if shard is not None and meta.get("layout") != SHARD_LAYOUT:
+        return None
+    keyword_index(G)
+    graph_store(shard).update(graph=G, store_id=store_id, last_id=meta["last_id"])
+    return G
+
+def get_graph(shard=None):
+    with graph_lock:
+        store = graph_store(shard)
+        store_id, last_id = store_version()
+        generation = graph_generation(shard)
+        if generation != store["generation"]:
+            store.update(graph=None, use_snapshot=True, generation=generation)
+        if store["graph"] is None and store["use_snapshot"]:
+            store["use_snapshot"] = False
+            load_saved_graph(shard, store_id, last_id)
+        
+        if store["graph"] is None or store_id != store["store_id"] or last_id < store["last_id"]:
+            store.update(graph=new_graph(shard), store_id=store_id, last_id=0)
+        
+        if last_id > store["last_id"]:
+            with stage_timer("graph_update"):
+                failures, read_id = read_new_failures(store["last_id"], shard)
+                for failure in failures:
+                    add_failure(store["graph"], failure)
+                store["last_id"] = max(read_id, last_id)
+            inc("devo_stage_items_total", len(failures), stage="graph_update")
+        
+        return store["graph"]
+
+def reset_graph(shard=None):
+    with graph_lock:
+        graph_store(shard).update(graph=None, store_id=None, last_id=0, use_snapshot=False)
+
+def graph_probe(G, run_id):
+    run_node = f"run_{run_id}"
+    if run_node not in G:
+        return None
+    return {
+        "run_node": run_node,
+        "errors": [node for node in G.successors(run_node) if G.nodes[node].get('type') == 'error'],
+        "keywords": frozenset(keyword_index(G)[1].get(run_node, ()))
+    }
+
+def record_probe(failure):
+    if failure is None:
+        return None
+    return {
+        "run_node": f"run_{failure['run_id']}",
+        "errors": list(dict.fromkeys(error_node_id(pattern, failure['run_id']) for pattern in failure['error_patterns'])),
+        "keywords": frozenset(pattern['keyword'] for pattern in failure['error_patterns'])
+    }
+
+def keyword_neighbors(G, probe, top_k=None, accept=None, ranked=None):
+    ranked = {} if ranked is None else ranked
+    if probe["keywords"] not in ranked:
+        limit = None if top_k is None else top_k + 1
+        ranked[probe["keywords"]] = rank_keyword_overlap(keyword_index(G)[0], probe["keywords"], limit, accept)
+    similar_runs = [item for item in ranked[probe["keywords"]] if item[0] != probe["run_node"]]
+    return similar_runs if top_k is None else similar_runs[:top_k]
+
+def signature_neighbors(G, probe, top_k=None, accept=None):
+    counts = Counter()
+    for error_node in probe["errors"]:
+        if error_node in G:
+            counts.update(run for run in G.predecessors(error_node) if G.nodes[run].get('type') == 'run' and (accept is None or accept(run)))
+    counts.pop(probe["run_node"], None)
+    return top_counts(counts.items(), top_k)
+
+def run_overlap(G, probe, run_node, measure="signature"):
+    if measure == "signature":
+        return sum(G.has_edge(run_node, error_node) for error_node in probe["errors"])
+    return len(probe["keywords"] & keyword_index(G)[1].get(run_node, set()))
+
+def shard_overlaps(shard, requests):
+    with graph_lock:
+        G = get_graph(shard)
+        return [
+            {} if probe is None else {run_node: run_overlap(G, probe, run_node, measure) for run_node in run_nodes if run_node in G}
+            for probe, run_nodes, measure in requests
+        ]
+
+def find_similar_failures(G, target_run_id, top_k=None):
+    return find_similar_failures_batch(G, [target_run_id], top_k)[target_run_id]
+
+def find_similar_failures_batch(G, target_run_ids, top_k=None, since=None):
+    accept = run_filter(G, since)
+    ranked = {}
+    results = {}
+    for target_run_id in target_run_ids:
+        probe = graph_probe(G, target_run_id)
+        results[target_run_id] = [] if probe is None else keyword_neighbors(G, probe, top_k, accept, ranked)
+    return results
+
+def find_signature_neighbors(G, target_run_id, top_k=None, since=None):
+    probe = graph_probe(G, target_run_id)
+    return [] if probe is None else signature_neighbors(G, probe, top_k, run_filter(G, since))
 
 def get_failure_path(G, run_id):
     run_node = f"run_{run_id}"
@@ -69,16 +240,136 @@ def get_failure_path(G, run_id):
     
     return path
 
-def save_graph(G):
-    os.makedirs("data", exist_ok=True)
-    nx.write_gexf(G, "data/knowledge_graph.gexf")
-    
-    graph_data = {
-        "nodes": [{"id": n, **G.nodes[n]} for n in G.nodes()],
-        "edges": [{"source": u, "target": v, **G.edges[u, v]} for u, v in G.edges()]
+def save_graph(G, shard=None):
+    with graph_lock:
+        store = graph_store(shard)
+        meta = {"format": GRAPH_FORMAT, "layout": SHARD_LAYOUT, "store_id": store["store_id"], "last_id": store["last_id"]} if G is store["graph"] else {}
+        return save_snapshot(G, meta, snapshot_path(shard))
+
+def export_graph(G, fmt):
+    path = EXPORT_FORMATS[fmt]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "gexf":
+        nx.write_gexf(G, path)
+    else:
+        with open(path, "w") as f:
+            json.dump({
+                "nodes": [{"id": n, **data} for n, data in G.nodes(data=True)],
+                "edges": [{"source": u, "target": v, **data} for u, v, data in G.edges(data=True)]
+            }, f)
+    return path
+
+def sorted_nodes(G):
+    nodes = G.graph.get("sorted_nodes")
+    if nodes is None or len(nodes) != G.number_of_nodes():
+        nodes = G.graph["sorted_nodes"] = sorted(G.nodes())
+    return nodes
+
+def neighborhood(G, center, depth=1, node_type=None):
+    if center not in G:
+        return []
+    nodes = nx.single_source_shortest_path_length(G.to_undirected(as_view=True), center, cutoff=depth)
+    return sorted(n for n in nodes if node_type is None or G.nodes[n].get('type') == node_type)
+
+def page_nodes(G, cursor=None, node_type=None, center=None, depth=1):
+    nodes = sorted_nodes(G) if center is None else neighborhood(G, center, depth, node_type)
+    start = 0 if cursor is None else bisect.bisect_right(nodes, cursor)
+    if node_type is None or center is not None:
+        return itertools.islice(nodes, start, None)
+    return (n for n in itertools.islice(nodes, start, None) if G.nodes[n].get('type') == node_type)
+
+def nodes_page(G, nodes, limit=GRAPH_PAGE_SIZE, max_edges=GRAPH_PAGE_EDGES):
+    page, edges, truncated = [], [], []
+    next_cursor = None
+    for n in nodes:
+        if len(page) == limit or (page and len(edges) + len(G.adj[n]) > max_edges):
+            next_cursor = page[-1]
+            break
+        page.append(n)
+        if len(G.adj[n]) > max_edges - len(edges):
+            truncated.append(n)
+        edges.extend({"source": n, "target": succ, **data} for succ, data in itertools.islice(G.adj[n].items(), max_edges - len(edges)))
+    return {
+        "nodes": [{"id": n, **G.nodes[n]} for n in page],
+        "edges": edges,
+        "truncated": truncated,
+        "next_cursor": next_cursor
     }
-    
-    with open("data/knowledge_graph.json", "w") as f:
-        json.dump(graph_data, f, indent=2)
-    
-    return len(G.nodes()), len(G.edges())
+
+def subgraph_page(G, cursor=None, limit=GRAPH_PAGE_SIZE, node_type=None, center=None, depth=1):
+    return nodes_page(G, page_nodes(G, cursor, node_type, center, depth), limit)
+
+def shard_graph_context(shard, probes, top_k=3, since=None, repo=None, signatures=True):
+    with graph_lock:
+        G = get_graph(shard)
+        accept = run_filter(G, since, repo)
+        ranked = {}
+        results = {}
+        for run_id, probe in probes.items():
+            if probe is None:
+                results[run_id] = {"signature": [], "keywords": [], "failure_path": None}
+                continue
+            signature = signature_neighbors(G, probe, top_k, accept) if signatures else []
+            results[run_id] = {
+                "signature": signature,
+                "keywords": [] if signature else keyword_neighbors(G, probe, top_k, accept, ranked),
+                "failure_path": get_failure_path(G, run_id) if probe["run_node"] in G else None
+            }
+        return results
+
+def merge_graph_contexts(run_ids, shard_results, top_k=3, signatures=True):
+    merged = {}
+    for run_id in run_ids:
+        parts = [result[run_id] for result in shard_results]
+        similar = top_counts(itertools.chain.from_iterable(part["signature"] for part in parts), top_k)
+        measure = "signature"
+        if not similar:
+            similar = top_counts(itertools.chain.from_iterable(part["keywords"] for part in parts), top_k)
+            measure = "keywords"
+        merged[run_id] = {
+            "graph_similar" if signatures else "similar_runs": similar,
+            "failure_path": next((part["failure_path"] for part in parts if part["failure_path"] is not None), [])
+        }
+        if signatures:
+            merged[run_id]["graph_measure"] = measure
+    return merged
+
+def target_probes(run_ids, records=None):
+    records = records or {}
+    return {run_id: record_probe(records[run_id] if run_id in records else get_failure(run_id)) for run_id in run_ids}
+
+def graph_context(run_id, top_k=3, since=None):
+    return graph_context_many([run_id], top_k, since)[run_id]
+
+def graph_context_many(run_ids, top_k=3, since=None, records=None):
+    probes = target_probes(run_ids, records)
+    return merge_graph_contexts(run_ids, [shard_graph_context(shard, probes, top_k, since) for shard in target_shards()], top_k)
+
+def graph_context_batch(run_ids, top_k=10, since=None, repo=None, records=None):
+    probes = target_probes(run_ids, records)
+    shard_results = [shard_graph_context(shard, probes, top_k, since, repo, False) for shard in target_shards(repo)]
+    return merge_graph_contexts(run_ids, shard_results, top_k, False)
+
+def graph_page(cursor=None, limit=GRAPH_PAGE_SIZE, node_type=None, center=None, depth=1):
+    with graph_lock:
+        return subgraph_page(get_graph(), cursor, limit, node_type, center, depth)
+
+def graph_neighborhood(center, depth=1, node_type=None):
+    with graph_lock:
+        return neighborhood(get_graph(), center, depth, node_type)
+
+def graph_nodes_page(nodes, limit=GRAPH_PAGE_SIZE):
+    with graph_lock:
+        G = get_graph()
+        return nodes_page(G, (n for n in nodes if n in G), limit)
+
+def export_current_graph(fmt):
+    with graph_lock:
+        return export_graph(get_graph(), fmt)
+
+def rebuild_graph(shard=None):
+    reset_graph(shard)
+    with graph_lock:
+        counts = save_graph(get_graph(shard), shard)
+        graph_store(shard)["generation"] = bump_graph_generation(shard)
+        return counts
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+LOG_DB_PATH = "data/logs.db"
+CHUNK_MIN_LINES = 64
+CHUNK_MAX_BYTES = 256 * 1024
+CHUNK_BOUNDARY_MASK = 0xFF
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+CHUNK_GC_GRACE = 3600
+TIMESTAMP_PREFIX = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?Z ")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    hash BLOB PRIMARY KEY,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    touched REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS logs (
+    repo TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (repo, run_id)
+);
+CREATE TABLE IF NOT EXISTS log_chunks (
+    repo TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    first_line INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    hash BLOB NOT NULL,
+    stamps BLOB,
+    PRIMARY KEY (repo, run_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_log_chunks_hash ON log_chunks(hash);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+
+def connect():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid() and _local.path == LOG_DB_PATH:
+        return conn
+    
+    os.makedirs(os.path.dirname(LOG_DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(LOG_DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with _init_lock:
+        with conn:
+            conn.executescript(SCHEMA)
+    
+    _local.conn, _local.pid, _local.path = conn, os.getpid(), LOG_DB_PATH
+    return conn
+
+def compress(data):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+def decompress(codec, data):
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if zstandard is None:
+        raise RuntimeError("Log chunk is zstd-compressed but the zstandard package is not installed")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+def split_stamp(line):
+    match = TIMESTAMP_PREFIX.match(line)
+    return (match.group(0), line[match.end():]) if match else ("", line)
+
+def is_boundary(text, lines, size):
+    return size >= CHUNK_MAX_BYTES or (lines >= CHUNK_MIN_LINES and zlib.crc32(text.encode("utf-8")) & CHUNK_BOUNDARY_MASK == 0)
+
+def write_chunk(conn, first_line, texts, stamps):
+    raw = "\n".join(texts).encode("utf-8")
+    digest = hashlib.blake2b(raw, digest_size=20).digest()
+    with conn:
+        touched = conn.execute("UPDATE chunks SET touched = ? WHERE hash = ?", (time.time(), digest)).rowcount
+    if not touched:
+        codec, data = compress(raw)
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO chunks (hash, codec, size, data, touched) VALUES (?, ?, ?, ?, ?)",
+                (digest, codec, len(raw), data, time.time())
+            )
+    packed_stamps = zlib.compress("\n".join(stamps).encode("utf-8")) if any(stamps) else None
+    return first_line, len(texts), digest, packed_stamps
+
+def save_manifest(conn, repo, run_id, lines, size, manifest):
+    with conn:
+        conn.execute("DELETE FROM log_chunks WHERE repo = ? AND run_id = ?", (repo, run_id))
+        conn.executemany(
+            "INSERT INTO log_chunks (repo, run_id, seq, first_line, lines, hash, stamps) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(repo, run_id, seq, *chunk) for seq, chunk in enumerate(manifest)]
+        )
+        conn.execute("INSERT OR REPLACE INTO logs (repo, run_id, lines, size) VALUES (?, ?, ?, ?)", (repo, run_id, lines, size))
+
+def logged_lines(repo, run_id, lines):
+    conn = connect()
+    manifest, texts, stamps = [], [], []
+    first_line = chunk_size = size = 0
+    try:
+        for line in lines:
+            stamp, text = split_stamp(line)
+            texts.append(text)
+            stamps.append(stamp)
+            chunk_size += len(text) + 1
+            size += len(line) + 1
+            yield line
+            
+            if is_boundary(text, len(texts), chunk_size):
+                manifest.append(write_chunk(conn, first_line, texts, stamps))
+                first_line += len(texts)
+                texts, stamps, chunk_size = [], [], 0
+    finally:
+        if texts:
+            manifest.append(write_chunk(conn, first_line, texts, stamps))
+            first_line += len(texts)
+        save_manifest(conn, repo, run_id, first_line, size, manifest)
+
+def store_log_text(repo, run_id, text):
+    deque(logged_lines(repo, run_id, text.split("\n")), maxlen=0)
+
+def has_log(repo, run_id):
+    return connect().execute("SELECT 1 FROM logs WHERE repo = ? AND run_id = ?", (repo, run_id)).fetchone() is not None
+
+def log_info(repo, run_id):
+    row = connect().execute("SELECT lines, size FROM logs WHERE repo = ? AND run_id = ?", (repo, run_id)).fetchone()
+    return {"lines": row[0], "size": row[1]} if row else None
+
+def normalize_ranges(ranges, total):
+    normalized = []
+    for start, end in ranges:
+        start, end, _ = slice(start, end).indices(total)
+        if start < end:
+            normalized.append((start, end))
+    return normalized
+
+def chunk_lines(conn, digest, stamps, cache):
+    if digest not in cache:
+        codec, data = conn.execute("SELECT codec, data FROM chunks WHERE hash = ?", (digest,)).fetchone()
+        cache[digest] = decompress(codec, data).decode("utf-8").split("\n")
+    texts = cache[digest]
+    if stamps is None:
+        return texts
+    return [stamp + text for stamp, text in zip(zlib.decompress(stamps).decode("utf-8").split("\n"), texts)]
+
+def read_log_ranges(repo, run_id, ranges):
+    conn = connect()
+    manifest = conn.execute(
+        "SELECT first_line, lines, hash, stamps FROM log_chunks WHERE repo = ? AND run_id = ? ORDER BY seq", (repo, run_id)
+    ).fetchall()
+    if not manifest:
+        return []
+    ranges = normalize_ranges(ranges, manifest[-1][0] + manifest[-1][1])
+    
+    selected = {}
+    cache = {}
+    for first_line, count, digest, stamps in manifest:
+        wanted = [(max(start, first_line), min(end, first_line + count)) for start, end in ranges if start < first_line + count and end > first_line]
+        if not wanted:
+            continue
+        lines = chunk_lines(conn, digest, stamps, cache)
+        for start, end in wanted:
+            for line_no in range(start, end):
+                selected[line_no] = lines[line_no - first_line]
+    
+    return sorted(selected.items())
+
+def read_log_lines(repo, run_id, start=0, end=None):
+    return [line for _, line in read_log_ranges(repo, run_id, [(start, end)])]
+
+def log_store_stats():
+    conn = connect()
+    chunks, raw_size, stored_size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM chunks").fetchone()
+    logs, log_size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM logs").fetchone()
+    return {
+        "codec": "zstd" if zstandard is not None else "zlib",
+        "logs": logs,
+        "log_bytes": log_size,
+        "chunks": chunks,
+        "chunk_bytes": raw_size,
+        "stored_bytes": stored_size
+    }
+
+def delete_logs(repo, run_ids):
+    conn = connect()
+    with conn:
+        conn.executemany("DELETE FROM log_chunks WHERE repo = ? AND run_id = ?", [(repo, run_id) for run_id in run_ids])
+        conn.executemany("DELETE FROM logs WHERE repo = ? AND run_id = ?", [(repo, run_id) for run_id in run_ids])
+
+def collect_chunks(grace=CHUNK_GC_GRACE):
+    conn = connect()
+    with conn:
+        return conn.execute(
+            "DELETE FROM chunks WHERE touched < ? AND NOT EXISTS (SELECT 1 FROM log_chunks WHERE log_chunks.hash = chunks.hash)",
+            (time.time() - grace,)
+        ).rowcount
+
+def clear_logs():
+    conn = connect()
+    with conn:
+        conn.execute("DELETE FROM log_chunks")
+        conn.execute("DELETE FROM logs")
+        conn.execute("DELETE FROM chunks")
@@ -1,17 +1,129 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import bisect
+import importlib
+import json
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 from collectors.ci_cd_collector import router as ci_router
 from collectors.monitoring_collector import router as monitoring_router
 from collectors.runtime_collector import router as runtime_router
-from ingestion import ingest_ci_failure
-from knowledge_graph import build_graph, save_graph
-from graph_rag import graph_rag_pipeline, query_knowledge_graph
+from ingestion import save_failures
+from bulk_ingestion import create_client, ingest_run, ingest_runs, list_failed_runs_for_repos, new_limiter
+from storage import filter_new_runs, get_failure
+from log_store import log_info, log_store_stats, read_log_lines
+from workers import run_cpu, run_io, save_shards, scatter, start_pools, stop_pools, warm_shards
+from shards import SHARD_COUNT
+from jobs import cancel_jobs, get_job, job_view, submit_job
+from diagnosis_cache import cache_stats, save_cache
+from failure_stats import MAX_TOP_N, TOP_N, get_stats, refresh_stats, save_stats
+from events import pipeline_stats, start_pipeline, stop_pipeline
+from metrics import http_metrics, register_collector
+from runtime_sampler import start_sampler, stop_sampler
+from retention import COMPACTION_INTERVAL, compact_store, retention_enabled, retention_status, window_start
 import os
 
-app = FastAPI(title="Devo CI/CD Failure Analysis")
+MAX_INFLIGHT = int(os.getenv("DEVO_MAX_INFLIGHT", 8))
+MAX_QUEUED = int(os.getenv("DEVO_MAX_QUEUED", 32))
+MAX_BATCH_RUNS = int(os.getenv("DEVO_MAX_BATCH_RUNS", 5000))
+QUEUE_TIMEOUT = float(os.getenv("DEVO_QUEUE_TIMEOUT", 10))
+MAX_GRAPH_DEPTH = 3
+MAX_LOG_LINES = 5000
+
+admission = {"slots": None, "waiting": 0, "inflight": 0}
+startup = {"task": None, "ready": False, "error": None, "started_at": None, "ready_in": None}
+compaction = {"task": None}
+
+def server_busy():
+    return HTTPException(status_code=429, detail="Server busy, retry later", headers={"Retry-After": "1"})
+
+@asynccontextmanager
+async def admit():
+    if admission["waiting"] >= MAX_QUEUED:
+        raise server_busy()
+    
+    admission["waiting"] += 1
+    try:
+        await asyncio.wait_for(admission["slots"].acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise server_busy()
+    finally:
+        admission["waiting"] -= 1
+    
+    admission["inflight"] += 1
+    try:
+        yield
+    finally:
+        admission["inflight"] -= 1
+        admission["slots"].release()
+
+def admission_samples():
+    return [({"state": "inflight"}, admission["inflight"]), ({"state": "waiting"}, admission["waiting"])]
+
+register_collector("devo_admission_requests", "gauge", "Heavy requests holding or waiting for an admission slot", admission_samples)
+
+async def warm_views():
+    await asyncio.gather(warm_shards(), run_io(refresh_stats))
+
+async def warm_start():
+    try:
+        await asyncio.gather(warm_views(), run_io(importlib.import_module, "graph_rag"))
+    except Exception as e:
+        startup["error"] = str(e)
+        return
+    startup["ready"] = True
+    startup["ready_in"] = time.monotonic() - startup["started_at"]
+
+async def compact_and_warm():
+    result = await run_io(compact_store)
+    if result["compacted"]:
+        await warm_views()
+    return result
+
+async def compaction_loop():
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL)
+        try:
+            await compact_and_warm()
+        except Exception:
+            continue
+
+def window_since(window):
+    try:
+        return window_start(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@asynccontextmanager
+async def lifespan(app):
+    admission["slots"] = asyncio.Semaphore(MAX_INFLIGHT)
+    start_pools()
+    start_sampler()
+    app.state.github_client = create_client()
+    start_pipeline()
+    startup.update(ready=False, error=None, started_at=time.monotonic(), ready_in=None)
+    startup["task"] = asyncio.create_task(warm_start())
+    compaction["task"] = asyncio.create_task(compaction_loop()) if retention_enabled() else None
+    yield
+    tasks = [task for task in (startup["task"], compaction["task"]) if task is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await cancel_jobs()
+    await stop_pipeline()
+    await app.state.github_client.aclose()
+    await save_shards()
+    stop_pools()
+    stop_sampler()
+    save_cache()
+    save_stats()
+
+app = FastAPI(title="Devo CI/CD Failure Analysis", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +132,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(http_metrics)
 
 app.mount("/static", StaticFiles(directory="frontend"), name="static")
 
@@ -32,76 +145,295 @@ class IngestRequest(BaseModel):
     run_id: int
     token: str
 
+class RunRef(BaseModel):
+    repo: str
+    run_id: int
+
+class BatchIngestRequest(BaseModel):
+    token: str
+    runs: List[RunRef] = []
+    repos: List[str] = []
+    max_runs_per_repo: int = 100
+
 class AnalyzeRequest(BaseModel):
     run_id: int
     query: str = "analyze ci failure"
+    window: Optional[str] = None
+
+class BatchAnalyzeRequest(BaseModel):
+    run_ids: List[int]
+    query: str = "analyze ci failure"
+    window: Optional[str] = None
 
 class QueryRequest(BaseModel):
     query: str
     top_k: int = 5
+    window: Optional[str] = None
+    repo: Optional[str] = None
 
 @app.get("/")
-def root():
+async def root():
     return FileResponse("frontend/index.html")
 
 @app.get("/app")
-def serve_app():
+async def serve_app():
     return FileResponse("frontend/index.html")
 
 @app.get("/api")
-def api_root():
+async def api_root():
     return {"message": "Devo CI/CD Analysis API", "status": "running"}
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy", "collectors": ["ci", "monitoring", "runtime"]}
 
+@app.get("/ready")
+async def readiness_check():
+    if startup["ready"]:
+        return {"status": "ready", "warm_start_seconds": round(startup["ready_in"], 3)}
+    if startup["error"]:
+        return JSONResponse(status_code=503, content={"status": "failed", "detail": startup["error"]})
+    return JSONResponse(status_code=503, content={"status": "starting"})
+
 @app.post("/ingest")
-def ingest_failure(request: IngestRequest):
+async def ingest_failure(request: IngestRequest):
     try:
-        result = ingest_ci_failure(request.repo, request.run_id, request.token)
+        result = await ingest_run(app.state.github_client, new_limiter(), request.repo, request.run_id, request.token)
+        await run_io(save_failures, [result])
         return {"status": "success", "data": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ingest/batch")
+async def ingest_failures_batch(request: BatchIngestRequest):
+    async with admit():
+        try:
+            client = app.state.github_client
+            limiter = new_limiter()
+            runs = [(run.repo, run.run_id) for run in request.runs]
+            if request.repos:
+                runs += await list_failed_runs_for_repos(request.repos, request.token, request.max_runs_per_repo, client, limiter)
+            runs = await run_io(filter_new_runs, runs)
+            result = await ingest_runs(runs, request.token, client, limiter)
+            return {"status": "success", **result}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+async def rebuild_graphs():
+    from knowledge_graph import rebuild_graph
+    (nodes, edges), _ = await asyncio.gather(run_cpu(rebuild_graph), scatter(rebuild_graph, range(SHARD_COUNT)))
+    return {"nodes": nodes, "edges": edges, "shards": SHARD_COUNT}
+
 @app.post("/build-graph")
-def build_knowledge_graph():
-    try:
-        G = build_graph()
-        nodes, edges = save_graph(G)
-        return {"status": "success", "nodes": nodes, "edges": edges}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def build_knowledge_graph():
+    async with admit():
+        try:
+            return {"status": "success", **await rebuild_graphs()}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/graph")
+async def get_graph_page(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    type: Optional[str] = None,
+    center: Optional[str] = None,
+    depth: int = Query(1, ge=0, le=MAX_GRAPH_DEPTH)
+):
+    from knowledge_graph import GRAPH_PAGE_SIZE, graph_page
+    limit = min(limit or GRAPH_PAGE_SIZE, GRAPH_PAGE_SIZE)
+    async with admit():
+        return await run_cpu(graph_page, cursor, limit, type, center, depth)
+
+@app.get("/graph/stream")
+async def stream_graph(type: Optional[str] = None, center: Optional[str] = None, depth: int = Query(1, ge=0, le=MAX_GRAPH_DEPTH)):
+    from knowledge_graph import GRAPH_PAGE_SIZE, graph_neighborhood, graph_nodes_page, graph_page
+    nodes = None
+    if center is not None:
+        async with admit():
+            nodes = await run_cpu(graph_neighborhood, center, depth, type)
+    elif admission["waiting"] >= MAX_QUEUED:
+        raise server_busy()
+    
+    async def pages():
+        cursor = None
+        while True:
+            try:
+                async with admit():
+                    if nodes is None:
+                        page = await run_cpu(graph_page, cursor, GRAPH_PAGE_SIZE, type)
+                    else:
+                        start = 0 if cursor is None else bisect.bisect_right(nodes, cursor)
+                        page = await run_cpu(graph_nodes_page, nodes[start:start + GRAPH_PAGE_SIZE + 1], GRAPH_PAGE_SIZE)
+            except HTTPException as e:
+                yield json.dumps({"error": e.detail, "status": e.status_code, "cursor": cursor}) + "\n"
+                break
+            yield json.dumps(page) + "\n"
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+    return StreamingResponse(pages(), media_type="application/x-ndjson")
+
+@app.get("/graph/export")
+async def export_graph(format: str = "json"):
+    from knowledge_graph import EXPORT_FORMATS, export_current_graph
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of {sorted(EXPORT_FORMATS)}")
+    async with admit():
+        path = await run_cpu(export_current_graph, format)
+    return FileResponse(path, filename=os.path.basename(path))
 
 @app.post("/analyze")
-def analyze_failure(request: AnalyzeRequest):
-    try:
-        result = graph_rag_pipeline(request.run_id, request.query)
-        return {"status": "success", "analysis": result}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def analyze_failure(request: AnalyzeRequest):
+    from graph_rag import graph_rag_pipeline_async
+    since = window_since(request.window)
+    async with admit():
+        try:
+            result = await graph_rag_pipeline_async(request.run_id, request.query, since)
+            return {"status": "success", "analysis": result}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/analyze/stream")
+async def analyze_failure_stream(run_id: int, query: str = "analyze ci failure", window: Optional[str] = None):
+    from graph_rag import graph_rag_stream
+    since = window_since(window)
+    if admission["waiting"] >= MAX_QUEUED:
+        raise server_busy()
+    
+    async def events():
+        try:
+            async with admit():
+                yield sse("start", {"run_id": run_id, "query": query})
+                async for event, data in graph_rag_stream(run_id, query, since):
+                    yield sse(event, data)
+        except HTTPException as e:
+            yield sse("analysis_error", {"detail": e.detail, "status": e.status_code})
+        except Exception as e:
+            yield sse("analysis_error", {"detail": str(e)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def batch_items(request):
+    if len(request.run_ids) > MAX_BATCH_RUNS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_RUNS} runs per batch")
+    return [(run_id, request.query) for run_id in request.run_ids]
+
+@app.post("/analyze/batch")
+async def analyze_failures_batch(request: BatchAnalyzeRequest):
+    from graph_rag import graph_rag_pipeline_batch
+    items = batch_items(request)
+    since = window_since(request.window)
+    async with admit():
+        try:
+            results = await graph_rag_pipeline_batch(items, since)
+            return {"status": "success", "count": len(results), "analyses": results}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/query")
-def query_graph(request: QueryRequest):
-    try:
-        results = query_knowledge_graph(request.query, request.top_k)
-        return {"status": "success", "results": results}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def query_graph(request: QueryRequest):
+    from graph_rag import query_knowledge_graph_async
+    since = window_since(request.window)
+    async with admit():
+        try:
+            results = await query_knowledge_graph_async(request.query, request.top_k, since, request.repo)
+            return {"status": "success", "results": results}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+def start_job(kind, params, fn):
+    job = submit_job(kind, params, fn)
+    if job is None:
+        raise HTTPException(status_code=429, detail="Job queue full, retry later", headers={"Retry-After": "5"})
+    return {"status": "accepted", "job": job_view(job)}
+
+@app.post("/jobs/analyze", status_code=202)
+async def submit_analysis_job(request: AnalyzeRequest):
+    from graph_rag import graph_rag_pipeline_async
+    since = window_since(request.window)
+    return start_job("analyze", request.model_dump(), lambda: graph_rag_pipeline_async(request.run_id, request.query, since))
+
+@app.post("/jobs/analyze/batch", status_code=202)
+async def submit_batch_analysis_job(request: BatchAnalyzeRequest):
+    from graph_rag import graph_rag_pipeline_batch
+    items = batch_items(request)
+    since = window_since(request.window)
+    return start_job("analyze-batch", request.model_dump(), lambda: graph_rag_pipeline_batch(items, since))
+
+@app.post("/jobs/build-graph", status_code=202)
+async def submit_build_graph_job():
+    return start_job("build-graph", {}, rebuild_graphs)
+
+@app.post("/jobs/compact", status_code=202)
+async def submit_compaction_job():
+    return start_job("compact", {}, compact_and_warm)
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] in ("queued", "running"):
+        return JSONResponse(status_code=202, content=job_view(job))
+    return job_view(job, with_result=True)
 
 @app.get("/stats")
-def get_stats():
+async def get_failure_stats(top: int = Query(TOP_N, ge=1, le=MAX_TOP_N)):
     try:
-        G = build_graph()
-        return {
-            "nodes": G.number_of_nodes(),
-            "edges": G.number_of_edges(),
-            "node_types": {node_type: len([n for n in G.nodes() if G.nodes[n].get('type') == node_type]) 
-                          for node_type in ['repository', 'workflow', 'run', 'error']}
-        }
+        return await run_io(get_stats, top)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/logs/stats")
+async def get_log_store_stats():
+    return await run_io(log_store_stats)
+
+@app.get("/logs/{run_id}")
+async def get_run_log(run_id: int, start: int = 0, end: Optional[int] = None, limit: int = Query(1000, ge=1, le=MAX_LOG_LINES), repo: Optional[str] = None):
+    if repo is None:
+        failure = await run_io(get_failure, run_id)
+        if failure is None:
+            raise HTTPException(status_code=404, detail="Failure not found")
+        repo = failure["repo"]
+    info = await run_io(log_info, repo, run_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Log not found")
+    start, stop, _ = slice(start, end).indices(info["lines"])
+    end = max(start, min(stop, start + limit))
+    lines = await run_io(read_log_lines, repo, run_id, start, end)
+    return {
+        "repo": repo,
+        "run_id": run_id,
+        "total_lines": info["lines"],
+        "start": start,
+        "end": end,
+        "next": end if end < stop else None,
+        "lines": lines
+    }
+
+@app.get("/retention")
+async def get_retention():
+    return retention_status()
+
+@app.get("/events/stats")
+async def get_event_stats():
+    return pipeline_stats()
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return cache_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,223 @@
+import asyncio
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROFILING_ENABLED = os.getenv("DEVO_PROFILING", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("DEVO_PROFILE_INTERVAL", 0.005))
+PROFILE_HISTORY = 20
+PROFILE_HEADER = b"x-devo-profile"
+IDLE_FRAMES = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get")}
+METRIC_HELP = {
+    "devo_http_request_duration_seconds": "HTTP request latency by route and status",
+    "devo_stage_duration_seconds": "Time spent in a pipeline stage",
+    "devo_stage_errors_total": "Pipeline stage calls that raised",
+    "devo_stage_items_total": "Items handled by a pipeline stage",
+    "devo_worker_task_duration_seconds": "Time from submitting a task to a worker pool until it returns",
+    "devo_llm_request_duration_seconds": "LLM completion latency",
+    "devo_llm_requests_total": "LLM diagnosis requests by outcome",
+    "devo_event_batch_duration_seconds": "Time an event stage spends on one coalesced batch",
+    "devo_event_latency_seconds": "Time from publishing an event until its stage finished",
+    "devo_events_processed_total": "Events handled by each event stage"
+}
+
+metrics_lock = threading.Lock()
+_metrics = {"counters": {}, "histograms": {}, "collectors": {}}
+_profiles = OrderedDict()
+
+def label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def inc(name, value=1, **labels):
+    key = label_key(labels)
+    with metrics_lock:
+        series = _metrics["counters"].setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    key = label_key(labels)
+    with metrics_lock:
+        series = _metrics["histograms"].setdefault(name, {})
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+        histogram["buckets"][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+def register_collector(name, kind, help_text, fn):
+    with metrics_lock:
+        _metrics["collectors"][name] = {"kind": kind, "help": help_text, "fn": fn}
+
+def reset_metrics():
+    with metrics_lock:
+        _metrics["counters"].clear()
+        _metrics["histograms"].clear()
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+@contextmanager
+def stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc("devo_stage_errors_total", stage=stage)
+        raise
+    finally:
+        observe("devo_stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+def timed(stage):
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f"{name}=\"{escape_label(value)}\"" for name, value in pairs) + "}"
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_histogram(name, series):
+    lines = []
+    for key, histogram in sorted(series.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram["buckets"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels(key, [('le', str(bound))])} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(key)} {format_value(histogram['sum'])}")
+        lines.append(f"{name}_count{format_labels(key)} {histogram['count']}")
+    return lines
+
+def render_prometheus():
+    with metrics_lock:
+        counters = {name: dict(series) for name, series in _metrics["counters"].items()}
+        histograms = {
+            name: {key: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]} for key, h in series.items()}
+            for name, series in _metrics["histograms"].items()
+        }
+        collectors = dict(_metrics["collectors"])
+    
+    lines = []
+    for name, series in sorted(histograms.items()):
+        lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+        lines += render_histogram(name, series)
+    for name, series in sorted(counters.items()):
+        lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} counter"]
+        lines += [f"{name}{format_labels(key)} {format_value(value)}" for key, value in sorted(series.items())]
+    for name, collector in sorted(collectors.items()):
+        try:
+            samples = list(collector["fn"]())
+        except Exception:
+            continue
+        lines += [f"# HELP {name} {collector['help']}", f"# TYPE {name} {collector['kind']}"]
+        lines += [f"{name}{format_labels(label_key(labels))} {format_value(value)}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+def frame_stack(frame):
+    stack = []
+    while frame is not None:
+        stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+def is_idle(frame):
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+@contextmanager
+def sample_stacks(interval=PROFILE_INTERVAL):
+    samples = Counter()
+    done = threading.Event()
+    
+    def sample():
+        me = threading.get_ident()
+        while not done.wait(interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != me and not is_idle(frame):
+                    samples[frame_stack(frame)] += 1
+    
+    sampler = threading.Thread(target=sample, name="devo-profiler", daemon=True)
+    sampler.start()
+    try:
+        yield samples
+    finally:
+        done.set()
+        sampler.join()
+
+def save_profile(profile_id, samples):
+    with metrics_lock:
+        _profiles[profile_id] = "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+        while len(_profiles) > PROFILE_HISTORY:
+            _profiles.popitem(last=False)
+
+def get_profile(profile_id):
+    with metrics_lock:
+        return _profiles.get(profile_id)
+
+def route_label(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+def http_metrics(app):
+    async def middleware(scope, receive, send):
+        if scope["type"] != "http":
+            await app(scope, receive, send)
+            return
+        
+        response = {"status": 500}
+        profile_id = uuid.uuid4().hex if PROFILING_ENABLED and dict(scope["headers"]).get(PROFILE_HEADER) else None
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                if profile_id:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-devo-profile-id", profile_id.encode())]
+            await send(message)
+        
+        start = time.perf_counter()
+        try:
+            if profile_id:
+                with sample_stacks() as samples:
+                    await app(scope, receive, send_with_status)
+                save_profile(profile_id, samples)
+            else:
+                await app(scope, receive, send_with_status)
+        finally:
+            observe(
+                "devo_http_request_duration_seconds",
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route_label(scope),
+                status=response["status"]
+            )
+    
+    return middleware
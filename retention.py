@@ -0,0 +1,98 @@
+import fnmatch
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from storage import compact_failures, retained_repos
+from log_store import collect_chunks
+from metrics import inc, timed
+
+RETENTION_DAYS = float(os.getenv("DEVO_RETENTION_DAYS", 0))
+RETENTION_POLICIES = os.getenv("DEVO_RETENTION_POLICIES", "")
+COMPACTION_INTERVAL = float(os.getenv("DEVO_COMPACTION_INTERVAL", 3600))
+WINDOW_PATTERN = re.compile(r"^(\d+)([mhdw])$")
+WINDOW_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+MAX_WINDOW_SECONDS = 10 * 365 * 86400
+
+compaction_lock = threading.Lock()
+_compaction = {"runs": 0, "last_run": None, "last_compacted": 0, "last_duration": None, "last_error": None}
+
+def parse_policies(spec):
+    policies = []
+    for item in spec.split(","):
+        if item.strip():
+            pattern, days = item.rsplit("=", 1)
+            policies.append((pattern.strip(), float(days)))
+    return policies
+
+POLICIES = parse_policies(RETENTION_POLICIES)
+
+def retention_days(repo):
+    for pattern, days in POLICIES:
+        if pattern == repo:
+            return days
+    for pattern, days in POLICIES:
+        if fnmatch.fnmatchcase(repo, pattern):
+            return days
+    return RETENTION_DAYS
+
+def retention_enabled():
+    return RETENTION_DAYS > 0 or any(days > 0 for _, days in POLICIES)
+
+def retention_cutoff(repo, now=None):
+    days = retention_days(repo)
+    if days <= 0:
+        return None
+    return ((now or datetime.now()) - timedelta(days=days)).isoformat()
+
+def parse_window(window):
+    match = WINDOW_PATTERN.match(window or "")
+    if not match:
+        raise ValueError(f"Invalid window {window!r}, use a number followed by m, h, d or w (e.g. 7d)")
+    seconds = int(match.group(1)) * WINDOW_UNITS[match.group(2)]
+    if seconds > MAX_WINDOW_SECONDS:
+        raise ValueError(f"Window {window!r} is longer than 10 years")
+    return seconds
+
+def window_start(window, now=None):
+    if window is None:
+        return None
+    return ((now or datetime.now()) - timedelta(seconds=parse_window(window))).isoformat()
+
+@timed("compaction")
+def compact_store(now=None):
+    with compaction_lock:
+        started = time.perf_counter()
+        _compaction["last_error"] = None
+        try:
+            compacted = {}
+            for repo in retained_repos():
+                cutoff = retention_cutoff(repo, now)
+                if cutoff is not None:
+                    count = compact_failures(repo, cutoff)
+                    if count:
+                        compacted[repo] = count
+            chunks = collect_chunks()
+        except Exception as e:
+            _compaction["last_error"] = str(e)
+            raise
+        
+        total = sum(compacted.values())
+        inc("devo_stage_items_total", total, stage="compaction")
+        _compaction.update(
+            runs=_compaction["runs"] + 1,
+            last_run=time.time(),
+            last_compacted=total,
+            last_duration=time.perf_counter() - started
+        )
+        return {"compacted": total, "repos": compacted, "chunks_freed": chunks}
+
+def retention_status():
+    return {
+        "enabled": retention_enabled(),
+        "default_days": RETENTION_DAYS,
+        "policies": [{"repo": pattern, "days": days} for pattern, days in POLICIES],
+        "interval_seconds": COMPACTION_INTERVAL,
+        "compaction": dict(_compaction)
+    }
@@ -0,0 +1,106 @@
+import heapq
+import os
+from storage import get_failure
+from metrics import timed
+
+FUSION_METHOD = os.getenv("DEVO_FUSION", "rrf")
+GRAPH_WEIGHT = float(os.getenv("DEVO_GRAPH_WEIGHT", 0.5))
+VECTOR_WEIGHT = float(os.getenv("DEVO_VECTOR_WEIGHT", 0.5))
+RRF_K = 60
+RETRIEVAL_CANDIDATES = int(os.getenv("DEVO_RETRIEVAL_CANDIDATES", 10))
+RETRIEVAL_TOP_K = int(os.getenv("DEVO_RETRIEVAL_TOP_K", 5))
+MAX_ERRORS_PER_HIT = 3
+
+def run_number(run_node):
+    return int(run_node[len("run_"):])
+
+def new_candidate():
+    return {"graph_score": 0.0, "vector_score": 0.0, "score": 0.0, "metadata": None}
+
+def missing_candidates(graph_similar, vector_similar, target_run_id=None):
+    exclude = {None if target_run_id is None else f"run_{target_run_id}"}
+    graph_nodes = dict.fromkeys(run_node for run_node, _ in graph_similar)
+    vector_nodes = dict.fromkeys(hit["doc_id"] for hit in vector_similar)
+    return (
+        [run_number(run_node) for run_node in graph_nodes if run_node not in vector_nodes and run_node not in exclude],
+        [run_node for run_node in vector_nodes if run_node not in graph_nodes and run_node not in exclude]
+    )
+
+def merge_scores(shard_results):
+    merged = []
+    for parts in zip(*shard_results):
+        scores = {}
+        for part in parts:
+            scores.update(part)
+        merged.append(scores)
+    return merged
+
+def fuse_scores(graph_similar, vector_similar, exclude=None, method=FUSION_METHOD, graph_scores=None, vector_scores=None):
+    candidates = {}
+    for run_node, score in graph_similar:
+        if run_node != exclude:
+            candidates.setdefault(run_node, new_candidate())["graph_score"] = score
+    
+    for hit in vector_similar:
+        if hit["doc_id"] != exclude:
+            candidate = candidates.setdefault(hit["doc_id"], new_candidate())
+            candidate["vector_score"] = hit["similarity"]
+            candidate["metadata"] = hit["metadata"]
+    
+    for key, scores in (("graph_score", graph_scores), ("vector_score", vector_scores)):
+        for run_node, score in (scores or {}).items():
+            if run_node in candidates:
+                candidates[run_node][key] = score
+    
+    max_graph = max((candidate["graph_score"] for candidate in candidates.values()), default=0) or 1
+    for candidate in candidates.values():
+        candidate["graph_score"] /= max_graph
+    
+    if method == "rrf":
+        for key, weight in (("graph_score", GRAPH_WEIGHT), ("vector_score", VECTOR_WEIGHT)):
+            ranked = sorted((candidate for candidate in candidates.values() if candidate[key] > 0), key=lambda c: c[key], reverse=True)
+            for rank, candidate in enumerate(ranked, 1):
+                candidate["score"] += weight / (RRF_K + rank)
+    else:
+        for candidate in candidates.values():
+            candidate["score"] = GRAPH_WEIGHT * candidate["graph_score"] + VECTOR_WEIGHT * candidate["vector_score"]
+    
+    return candidates
+
+@timed("fusion")
+def fuse_results(graph_similar, vector_similar, target_run_id=None, top_k=RETRIEVAL_TOP_K, graph_scores=None, vector_scores=None):
+    exclude = None if target_run_id is None else f"run_{target_run_id}"
+    candidates = fuse_scores(graph_similar, vector_similar, exclude, graph_scores=graph_scores, vector_scores=vector_scores)
+    return heapq.nsmallest(top_k, candidates.items(), key=lambda item: (-item[1]["score"], item[0]))
+
+def missing_records(fused_lists):
+    return {run_number(run_node) for fused in fused_lists for run_node, candidate in fused if candidate["metadata"] is None}
+
+def load_records(run_ids):
+    return {run_id: get_failure(run_id) for run_id in run_ids}
+
+def summarize_hit(run_node, candidate, record):
+    record = record or {}
+    errors = {}
+    for pattern in record.get("error_patterns", []):
+        text = pattern.get("line") or pattern.get("context", "")
+        errors.setdefault(pattern.get("signature") or text, text)
+    return {
+        "run_id": run_number(run_node),
+        "repo": record.get("repo"),
+        "workflow": record.get("workflow"),
+        "score": round(candidate["score"], 6),
+        "graph_score": round(candidate["graph_score"], 4),
+        "vector_score": round(candidate["vector_score"], 4),
+        "errors": list(errors.values())[:MAX_ERRORS_PER_HIT]
+    }
+
+def summarize_results(fused, records):
+    return [
+        summarize_hit(run_node, candidate, candidate["metadata"] or records.get(run_number(run_node)))
+        for run_node, candidate in fused
+    ]
+
+def retrieve(graph_similar, vector_similar, target_run_id=None, top_k=RETRIEVAL_TOP_K, graph_scores=None, vector_scores=None):
+    fused = fuse_results(graph_similar, vector_similar, target_run_id, top_k, graph_scores, vector_scores)
+    return summarize_results(fused, load_records(missing_records([fused])))
@@ -0,0 +1,185 @@
+import heapq
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+import psutil
+
+RUNTIME_INTERVAL = float(os.getenv("DEVO_RUNTIME_INTERVAL", 5))
+PROCESS_INTERVAL = float(os.getenv("DEVO_RUNTIME_PROCESS_INTERVAL", 30))
+RUNTIME_RETENTION = 24 * 3600
+RUNTIME_EVENT_LIMIT = int(os.getenv("DEVO_RUNTIME_EVENT_LIMIT", 10000))
+TOP_PROCESSES = 10
+WINDOWS = {"1m": 60, "1h": 3600, "24h": 24 * 3600}
+WINDOW_POINTS = 60
+FIELDS = [
+    "timestamp", "cpu_percent", "memory_percent", "memory_available", "disk_percent", "disk_free",
+    "process_cpu_percent", "process_rss", "process_threads"
+]
+
+sampler_lock = threading.Lock()
+_samples = {"data": None, "next": 0, "size": 0}
+_sampler = {"thread": None, "stop": None, "processes": [], "top_processes": None, "processes_at": 0.0, "totals": {}}
+_events = deque(maxlen=RUNTIME_EVENT_LIMIT)
+
+def buffer_capacity():
+    return int(RUNTIME_RETENTION / RUNTIME_INTERVAL) + 1
+
+def refresh_processes(now):
+    me = psutil.Process()
+    with sampler_lock:
+        known = {proc.pid: proc for proc in _sampler["processes"]}
+    try:
+        group = [me] + me.children(recursive=True)
+    except psutil.Error:
+        group = [me]
+    processes = [known.get(proc.pid, proc) for proc in group]
+    
+    infos = [proc.info for proc in psutil.process_iter(["pid", "name", "cpu_percent", "memory_percent"])]
+    top = heapq.nlargest(TOP_PROCESSES, infos, key=lambda info: info["cpu_percent"] or 0)
+    with sampler_lock:
+        _sampler.update(processes=processes, top_processes=top, processes_at=now)
+    return top
+
+def process_usage():
+    cpu = rss = threads = 0
+    with sampler_lock:
+        processes = _sampler["processes"]
+    for proc in processes:
+        try:
+            with proc.oneshot():
+                cpu += proc.cpu_percent(None)
+                rss += proc.memory_info().rss
+                threads += proc.num_threads()
+        except psutil.Error:
+            continue
+    return cpu, rss, threads
+
+def record(row):
+    with sampler_lock:
+        if _samples["data"] is None:
+            _samples["data"] = np.zeros((buffer_capacity(), len(FIELDS)), dtype=np.float64)
+        data = _samples["data"]
+        data[_samples["next"]] = row
+        _samples["next"] = (_samples["next"] + 1) % len(data)
+        _samples["size"] = min(_samples["size"] + 1, len(data))
+
+def sample_once():
+    now = time.time()
+    if now - _sampler["processes_at"] >= PROCESS_INTERVAL:
+        refresh_processes(now)
+    
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage("/")
+    _sampler["totals"] = {"memory": memory.total, "disk": disk.total}
+    record([now, psutil.cpu_percent(None), memory.percent, memory.available, disk.percent, disk.free, *process_usage()])
+
+def run_sampler(stop):
+    while True:
+        started = time.monotonic()
+        try:
+            sample_once()
+        except Exception:
+            pass
+        if stop.wait(max(0.0, RUNTIME_INTERVAL - (time.monotonic() - started))):
+            return
+
+def start_sampler():
+    if _sampler["thread"] is not None:
+        return
+    stop = threading.Event()
+    _sampler["stop"] = stop
+    _sampler["thread"] = threading.Thread(target=run_sampler, args=(stop,), name="devo-runtime-sampler", daemon=True)
+    _sampler["thread"].start()
+
+def stop_sampler():
+    if _sampler["thread"] is None:
+        return
+    _sampler["stop"].set()
+    _sampler["thread"].join()
+    _sampler.update(thread=None, stop=None)
+
+def recent_rows(start):
+    with sampler_lock:
+        if not _samples["size"]:
+            return np.zeros((0, len(FIELDS)))
+        count = min(_samples["size"], int((time.time() - start) / RUNTIME_INTERVAL) + 2)
+        data = _samples["data"]
+        rows = data[np.arange(_samples["next"] - count, _samples["next"]) % len(data)]
+    return rows[rows[:, 0] >= start]
+
+def latest_sample():
+    if not _samples["size"]:
+        sample_once()
+    with sampler_lock:
+        row = _samples["data"][_samples["next"] - 1].copy()
+    return {name: float(row[i]) for i, name in enumerate(FIELDS)}
+
+def system_snapshot(sample=None):
+    sample = sample or latest_sample()
+    totals = _sampler["totals"]
+    return {
+        "cpu_percent": sample["cpu_percent"],
+        "memory": {
+            "total": totals["memory"],
+            "available": int(sample["memory_available"]),
+            "percent": sample["memory_percent"]
+        },
+        "disk": {
+            "total": totals["disk"],
+            "free": int(sample["disk_free"]),
+            "percent": sample["disk_percent"]
+        },
+        "process": {
+            "cpu_percent": sample["process_cpu_percent"],
+            "rss": int(sample["process_rss"]),
+            "threads": int(sample["process_threads"])
+        },
+        "timestamp": sample["timestamp"]
+    }
+
+def top_processes():
+    with sampler_lock:
+        top = _sampler["top_processes"]
+    return refresh_processes(time.time()) if top is None else top
+
+def series(start, end, points=WINDOW_POINTS):
+    rows = recent_rows(start)
+    rows = rows[rows[:, 0] <= end]
+    points = max(1, min(points, int((end - start) / RUNTIME_INTERVAL)))
+    if not len(rows):
+        return []
+    
+    step = (end - start) / points
+    buckets = np.minimum(((rows[:, 0] - start) // step).astype(np.int64), points - 1)
+    counts = np.bincount(buckets, minlength=points)
+    sums = np.stack([np.bincount(buckets, weights=rows[:, i], minlength=points) for i in range(1, len(FIELDS))], axis=1)
+    
+    return [
+        {"timestamp": start + bucket * step, **{name: float(sums[bucket, i] / counts[bucket]) for i, name in enumerate(FIELDS[1:])}}
+        for bucket in np.flatnonzero(counts)
+    ]
+
+def window_series(window, points=WINDOW_POINTS):
+    now = time.time()
+    return series(now - WINDOWS[window], now, points)
+
+def record_event(service, errors, timestamp=None):
+    event = {
+        "timestamp": time.time() if timestamp is None else timestamp,
+        "service": service,
+        "errors": errors,
+        "metrics": system_snapshot()
+    }
+    with sampler_lock:
+        _events.append(event)
+    return event
+
+def events_between(start, end, service=None):
+    with sampler_lock:
+        events = list(_events)
+    return [
+        event for event in events
+        if start <= event["timestamp"] <= end and (service is None or event["service"] == service)
+    ]
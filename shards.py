@@ -0,0 +1,19 @@
+import os
+import zlib
+
+SHARD_COUNT = max(1, int(os.getenv("DEVO_SHARDS", min(4, os.cpu_count() or 1))))
+SHARD_KEY = os.getenv("DEVO_SHARD_KEY", "org")
+
+SHARD_LAYOUT = f"{SHARD_KEY}:{SHARD_COUNT}"
+
+def shard_key(repo):
+    return repo.split("/", 1)[0] if SHARD_KEY == "org" else repo
+
+def shard_of(repo):
+    return zlib.crc32(shard_key(repo or "").encode("utf-8")) % SHARD_COUNT
+
+def target_shards(repo=None):
+    return [shard_of(repo)] if repo else list(range(SHARD_COUNT))
+
+def shard_dir(path, shard):
+    return os.path.join(path, f"shard_{shard}")
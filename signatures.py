@@ -0,0 +1,109 @@
+import re
+import zlib
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+CLUSTER_THRESHOLD = 0.6
+MERSENNE_PRIME = (1 << 61) - 1
+SIGNATURE_CACHE_SIZE = 100000
+
+NORMALIZERS = [
+    (re.compile(r"^\s*\d{4}-\d{2}-\d{2}t\d{2}:\d{2}:\d{2}(\.\d+)?z\s*"), ""),
+    (re.compile(r"##\[(error|warning|group|endgroup)\]"), ""),
+    (re.compile(r"\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}:\d{2}(\.\d+)?z?"), "<ts>"),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}(\.\d+)?\b"), "<ts>"),
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"), "<uuid>"),
+    (re.compile(r"\b0x[0-9a-f]+\b|\b[0-9a-f]{7,}\b"), "<hex>"),
+    (re.compile(r"(?:[a-z]:)?(?:[\\/][\w.@-]+)+(?::\d+)*"), "<path>"),
+    (re.compile(r"\bline \d+\b"), "line <n>"),
+    (re.compile(r"\d+"), "<n>"),
+    (re.compile(r"\s+"), " ")
+]
+
+_rng = np.random.RandomState(7)
+PERM_A = _rng.randint(1, 2 ** 31 - 1, NUM_PERM).astype(np.uint64)
+PERM_B = _rng.randint(0, 2 ** 31 - 1, NUM_PERM).astype(np.uint64)
+
+def normalize_text(text):
+    text = (text or "").lower()
+    for pattern, replacement in NORMALIZERS:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+def shingles(signature):
+    tokens = signature.split()
+    if len(tokens) < 2:
+        return set(tokens) or {signature}
+    return {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+def minhash(signature):
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles(signature)], dtype=np.uint64)
+    return ((np.outer(hashes, PERM_A) + PERM_B) % MERSENNE_PRIME).min(axis=0)
+
+def band_buckets(signature_hash):
+    return [zlib.crc32(signature_hash[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+def estimate_similarity(a, b):
+    return float(np.mean(a == b))
+
+def lookup_signature(conn, cache, signature):
+    if signature in cache:
+        return cache[signature]
+    row = conn.execute("SELECT cluster_id FROM signatures WHERE signature = ?", (signature,)).fetchone()
+    return row[0] if row else None
+
+def remember_signature(cache, signature, cluster_id):
+    if len(cache) >= SIGNATURE_CACHE_SIZE:
+        cache.clear()
+    cache[signature] = cluster_id
+
+def find_cluster(conn, signature_hash, buckets):
+    candidates = set()
+    for band, bucket in enumerate(buckets):
+        for (cluster_id,) in conn.execute(
+            "SELECT cluster_id FROM signature_bands WHERE band = ? AND bucket = ?", (band, bucket)
+        ):
+            candidates.add(cluster_id)
+    
+    best, best_score = None, CLUSTER_THRESHOLD
+    for cluster_id in candidates:
+        row = conn.execute("SELECT minhash FROM clusters WHERE id = ?", (cluster_id,)).fetchone()
+        score = estimate_similarity(signature_hash, np.frombuffer(row[0], dtype=np.uint64))
+        if score >= best_score:
+            best, best_score = cluster_id, score
+    return best
+
+def assign_cluster(conn, cache, signature, keyword, context):
+    cluster_id = lookup_signature(conn, cache, signature)
+    if cluster_id is not None:
+        remember_signature(cache, signature, cluster_id)
+        return cluster_id
+    
+    signature_hash = minhash(signature)
+    buckets = band_buckets(signature_hash)
+    cluster_id = find_cluster(conn, signature_hash, buckets)
+    
+    if cluster_id is None:
+        cluster_id = conn.execute(
+            "INSERT INTO clusters (keyword, representative, context, minhash) VALUES (?, ?, ?, ?)",
+            (keyword, signature, context, signature_hash.tobytes())
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO signature_bands (band, bucket, cluster_id) VALUES (?, ?, ?)",
+            [(band, bucket, cluster_id) for band, bucket in enumerate(buckets)]
+        )
+    
+    conn.execute("INSERT OR IGNORE INTO signatures (signature, cluster_id) VALUES (?, ?)", (signature, cluster_id))
+    cluster_id = conn.execute("SELECT cluster_id FROM signatures WHERE signature = ?", (signature,)).fetchone()[0]
+    remember_signature(cache, signature, cluster_id)
+    return cluster_id
+
+def assign_clusters(conn, cache, failures):
+    for failure in failures:
+        for pattern in failure.get("error_patterns", []):
+            if "cluster" in pattern:
+                continue
+            pattern["signature"] = normalize_text(pattern.get("line") or pattern.get("context"))
+            pattern["cluster"] = assign_cluster(conn, cache, pattern["signature"], pattern.get("keyword"), pattern.get("context"))
@@ -0,0 +1,404 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from signatures import assign_clusters
+from log_store import clear_logs, delete_logs, has_log, store_log_text
+from shards import shard_of
+
+DB_PATH = "data/devo.db"
+LEGACY_FAILURES_PATH = "data/failures.json"
+INSERT_BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS failures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    workflow TEXT,
+    status TEXT,
+    conclusion TEXT,
+    commit_sha TEXT,
+    timestamp TEXT,
+    error_patterns TEXT NOT NULL,
+    raw_logs TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_failures_repo_run ON failures(repo, run_id);
+CREATE INDEX IF NOT EXISTS idx_failures_run ON failures(run_id);
+CREATE INDEX IF NOT EXISTS idx_failures_repo_time ON failures(repo, timestamp);
+CREATE INDEX IF NOT EXISTS idx_failures_workflow_time ON failures(workflow, timestamp);
+CREATE INDEX IF NOT EXISTS idx_failures_time ON failures(timestamp);
+CREATE TABLE IF NOT EXISTS clusters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    keyword TEXT,
+    representative TEXT NOT NULL,
+    context TEXT,
+    minhash BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signatures (
+    signature TEXT PRIMARY KEY,
+    cluster_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signature_bands (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    cluster_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_signature_bands ON signature_bands(band, bucket);
+CREATE TABLE IF NOT EXISTS rollups (
+    repo TEXT NOT NULL,
+    workflow TEXT NOT NULL,
+    day TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    run_errors INTEGER NOT NULL,
+    PRIMARY KEY (repo, workflow, day)
+);
+CREATE TABLE IF NOT EXISTS rollup_errors (
+    repo TEXT NOT NULL,
+    workflow TEXT NOT NULL,
+    day TEXT NOT NULL,
+    error TEXT NOT NULL,
+    keyword TEXT,
+    signature TEXT,
+    context TEXT,
+    failures INTEGER NOT NULL,
+    patterns INTEGER NOT NULL,
+    PRIMARY KEY (repo, workflow, day, error)
+);
+CREATE TABLE IF NOT EXISTS rollup_hours (
+    hour TEXT PRIMARY KEY,
+    failures INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_keywords (
+    keyword TEXT PRIMARY KEY,
+    patterns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS compacted_runs (
+    repo TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    PRIMARY KEY (repo, run_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_compacted_runs_run ON compacted_runs(run_id);
+"""
+
+FAILURE_COLUMNS = "id, repo, run_id, workflow, status, conclusion, commit_sha, timestamp, error_patterns"
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_signature_caches = {}
+
+def connect():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid() and _local.path == DB_PATH:
+        return conn
+    
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.create_function("shard_of", 1, shard_of, deterministic=True)
+    with _init_lock:
+        initialize(conn)
+    
+    _local.conn, _local.pid, _local.path = conn, os.getpid(), DB_PATH
+    return conn
+
+def initialize(conn):
+    with conn:
+        conn.executescript(SCHEMA)
+        created = conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (uuid.uuid4().hex,)
+        ).rowcount
+    if created and os.path.exists(LEGACY_FAILURES_PATH):
+        import_legacy_failures(conn)
+    migrate_inline_logs(conn)
+
+def migrate_inline_logs(conn):
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'inline_logs_migrated'").fetchone():
+        return
+    while True:
+        rows = conn.execute(
+            "SELECT id, repo, run_id, raw_logs FROM failures WHERE raw_logs IS NOT NULL LIMIT ?", (INSERT_BATCH_SIZE,)
+        ).fetchall()
+        if not rows:
+            break
+        for _, repo, run_id, raw_logs in rows:
+            if raw_logs and not has_log(repo, run_id):
+                store_log_text(repo, run_id, raw_logs)
+        with conn:
+            conn.executemany("UPDATE failures SET raw_logs = NULL WHERE id = ?", [(row[0],) for row in rows])
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('inline_logs_migrated', '1')")
+
+def import_legacy_failures(conn):
+    batch = []
+    with open(LEGACY_FAILURES_PATH, "r") as f:
+        for line in f:
+            if line.strip():
+                batch.append(json.loads(line))
+            if len(batch) >= INSERT_BATCH_SIZE:
+                write_failures(conn, batch)
+                batch = []
+    write_failures(conn, batch)
+
+def failure_row(failure):
+    return (
+        failure["repo"],
+        failure["run_id"],
+        failure.get("workflow"),
+        failure.get("status"),
+        failure.get("conclusion"),
+        failure.get("commit"),
+        failure.get("timestamp"),
+        json.dumps(failure.get("error_patterns", []))
+    )
+
+def row_failure(row):
+    return {
+        "run_id": row[2],
+        "repo": row[1],
+        "status": row[4],
+        "conclusion": row[5],
+        "workflow": row[3],
+        "commit": row[6],
+        "timestamp": row[7],
+        "error_patterns": json.loads(row[8])
+    }
+
+def store_inline_logs(failures):
+    for failure in failures:
+        if failure.get("raw_logs") and not has_log(failure["repo"], failure["run_id"]):
+            store_log_text(failure["repo"], failure["run_id"], failure["raw_logs"])
+
+def is_compacted(conn, repo, run_id):
+    if repo is None:
+        return conn.execute("SELECT 1 FROM compacted_runs WHERE run_id = ? LIMIT 1", (run_id,)).fetchone() is not None
+    return conn.execute("SELECT 1 FROM compacted_runs WHERE repo = ? AND run_id = ?", (repo, run_id)).fetchone() is not None
+
+def write_failures(conn, failures):
+    failures = [failure for failure in failures if not is_compacted(conn, failure["repo"], failure["run_id"])]
+    if not failures:
+        return 0
+    store_inline_logs(failures)
+    cache = _signature_caches.setdefault(DB_PATH, {})
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            assign_clusters(conn, cache, failures)
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO failures (repo, run_id, workflow, status, conclusion, commit_sha, "
+                "timestamp, error_patterns) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [failure_row(failure) for failure in failures]
+            )
+            return conn.total_changes - before
+    except Exception:
+        cache.clear()
+        raise
+
+def insert_failures(failures):
+    conn = connect()
+    inserted = 0
+    for start in range(0, len(failures), INSERT_BATCH_SIZE):
+        inserted += write_failures(conn, failures[start:start + INSERT_BATCH_SIZE])
+    return inserted
+
+def failure_exists(run_id, repo=None):
+    conn = connect()
+    if repo is None:
+        row = conn.execute("SELECT 1 FROM failures WHERE run_id = ? LIMIT 1", (run_id,)).fetchone()
+    else:
+        row = conn.execute("SELECT 1 FROM failures WHERE repo = ? AND run_id = ?", (repo, run_id)).fetchone()
+    return row is not None or is_compacted(conn, repo, run_id)
+
+def filter_new_runs(runs):
+    conn = connect()
+    return [
+        (repo, run_id) for repo, run_id in runs
+        if conn.execute("SELECT 1 FROM failures WHERE repo = ? AND run_id = ?", (repo, run_id)).fetchone() is None
+        and not is_compacted(conn, repo, run_id)
+    ]
+
+def get_failure(run_id, repo=None):
+    conn = connect()
+    if repo is None:
+        row = conn.execute(f"SELECT {FAILURE_COLUMNS} FROM failures WHERE run_id = ? ORDER BY id DESC LIMIT 1", (run_id,)).fetchone()
+    else:
+        row = conn.execute(f"SELECT {FAILURE_COLUMNS} FROM failures WHERE repo = ? AND run_id = ?", (repo, run_id)).fetchone()
+    return row_failure(row) if row else None
+
+def iter_failures(since_id=0, batch_size=INSERT_BATCH_SIZE, shard=None):
+    conn = connect()
+    where = "id > ?" if shard is None else "id > ? AND shard_of(repo) = ?"
+    while True:
+        params = (since_id, batch_size) if shard is None else (since_id, shard, batch_size)
+        rows = conn.execute(
+            f"SELECT {FAILURE_COLUMNS} FROM failures WHERE {where} ORDER BY id LIMIT ?", params
+        ).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield row[0], row_failure(row)
+        since_id = rows[-1][0]
+
+def read_new_failures(since_id=0, shard=None):
+    failures = []
+    for since_id, failure in iter_failures(since_id, shard=shard):
+        failures.append(failure)
+    return failures, since_id
+
+def load_failures(shard=None):
+    return read_new_failures(shard=shard)[0]
+
+def query_failures(repo=None, workflow=None, since=None, until=None, limit=100):
+    clauses, params = [], []
+    for clause, value in [("repo = ?", repo), ("workflow = ?", workflow), ("timestamp >= ?", since), ("timestamp < ?", until)]:
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = connect().execute(
+        f"SELECT {FAILURE_COLUMNS} FROM failures {where} ORDER BY timestamp DESC, id DESC LIMIT ?", (*params, limit)
+    ).fetchall()
+    return [row_failure(row) for row in rows]
+
+def latest_failures(limit=1):
+    rows = connect().execute(f"SELECT {FAILURE_COLUMNS} FROM failures ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [row_failure(row) for row in rows]
+
+def store_version():
+    conn = connect()
+    store_id = conn.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+    last_id = conn.execute("SELECT MAX(id) FROM failures").fetchone()[0] or 0
+    return store_id, last_id
+
+def generation_key(shard=None):
+    return "graph_generation" if shard is None else f"graph_generation_{shard}"
+
+def graph_generation(shard=None):
+    row = connect().execute("SELECT value FROM meta WHERE key = ?", (generation_key(shard),)).fetchone()
+    return int(row[0]) if row else 0
+
+def bump_graph_generation(shard=None):
+    conn = connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, '1') ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+            (generation_key(shard),)
+        )
+    return graph_generation(shard)
+
+def rotate_store_id(conn):
+    conn.execute("UPDATE meta SET value = ? WHERE key = 'store_id'", (uuid.uuid4().hex,))
+
+def failure_rollups(failures):
+    runs, errors, hours, keywords = {}, {}, {}, {}
+    for failure in failures:
+        timestamp = failure.get("timestamp") or ""
+        if len(timestamp) >= 13:
+            hours[timestamp[:13]] = hours.get(timestamp[:13], 0) + 1
+        key = (failure["repo"], failure.get("workflow") or "", timestamp[:10] if len(timestamp) >= 13 else "")
+        seen = set()
+        for pattern in failure["error_patterns"]:
+            keywords[pattern["keyword"]] = keywords.get(pattern["keyword"], 0) + 1
+            error = str(pattern.get("cluster", pattern["keyword"]))
+            entry = errors.setdefault(key + (error,), [pattern["keyword"], pattern.get("signature"), pattern.get("context"), 0, 0])
+            entry[4] += 1
+            if error not in seen:
+                seen.add(error)
+                entry[3] += 1
+        run = runs.setdefault(key, [0, 0])
+        run[0] += 1
+        run[1] += len(seen)
+    return runs, errors, hours, keywords
+
+def write_rollups(conn, failures):
+    runs, errors, hours, keywords = failure_rollups(failures)
+    conn.executemany(
+        "INSERT INTO rollups (repo, workflow, day, failures, run_errors) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (repo, workflow, day) DO UPDATE SET failures = failures + excluded.failures, "
+        "run_errors = run_errors + excluded.run_errors",
+        [(*key, *counts) for key, counts in runs.items()]
+    )
+    conn.executemany(
+        "INSERT INTO rollup_errors (repo, workflow, day, error, keyword, signature, context, failures, patterns) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (repo, workflow, day, error) DO UPDATE SET "
+        "failures = failures + excluded.failures, patterns = patterns + excluded.patterns",
+        [(*key, *entry) for key, entry in errors.items()]
+    )
+    conn.executemany(
+        "INSERT INTO rollup_hours (hour, failures) VALUES (?, ?) "
+        "ON CONFLICT (hour) DO UPDATE SET failures = failures + excluded.failures",
+        list(hours.items())
+    )
+    conn.executemany(
+        "INSERT INTO rollup_keywords (keyword, patterns) VALUES (?, ?) "
+        "ON CONFLICT (keyword) DO UPDATE SET patterns = patterns + excluded.patterns",
+        list(keywords.items())
+    )
+
+def compact_failures(repo, cutoff, batch_size=INSERT_BATCH_SIZE):
+    conn = connect()
+    compacted = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT {FAILURE_COLUMNS} FROM failures WHERE repo = ? AND timestamp < ? ORDER BY id LIMIT ?", (repo, cutoff, batch_size)
+        ).fetchall()
+        if not rows:
+            return compacted
+        failures = [row_failure(row) for row in rows]
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            write_rollups(conn, failures)
+            conn.executemany(
+                "INSERT OR IGNORE INTO compacted_runs (repo, run_id) VALUES (?, ?)",
+                [(failure["repo"], failure["run_id"]) for failure in failures]
+            )
+            conn.executemany("DELETE FROM failures WHERE id = ?", [(row[0],) for row in rows])
+            rotate_store_id(conn)
+        delete_logs(repo, [failure["run_id"] for failure in failures])
+        compacted += len(rows)
+
+def retained_repos():
+    return [row[0] for row in connect().execute("SELECT DISTINCT repo FROM failures")]
+
+def load_rollups():
+    conn = connect()
+    runs = conn.execute("SELECT repo, workflow, day, failures, run_errors FROM rollups").fetchall()
+    errors = conn.execute("SELECT repo, workflow, day, error, keyword, signature, context, failures, patterns FROM rollup_errors").fetchall()
+    hours = conn.execute("SELECT hour, failures FROM rollup_hours").fetchall()
+    keywords = conn.execute("SELECT keyword, patterns FROM rollup_keywords").fetchall()
+    return runs, errors, hours, keywords
+
+def rollup_signatures(shard=None):
+    where = "" if shard is None else "WHERE shard_of(repo) = ?"
+    return connect().execute(
+        f"SELECT repo, workflow, error, keyword, signature, context, SUM(failures) FROM rollup_errors {where} "
+        "GROUP BY repo, workflow, error", () if shard is None else (shard,)
+    ).fetchall()
+
+def get_clusters(cluster_ids):
+    conn = connect()
+    clusters = {}
+    for cluster_id in cluster_ids:
+        row = conn.execute("SELECT id, keyword, representative, context FROM clusters WHERE id = ?", (cluster_id,)).fetchone()
+        if row:
+            clusters[row[0]] = {"cluster": row[0], "keyword": row[1], "signature": row[2], "context": row[3]}
+    return clusters
+
+def clear_failures():
+    conn = connect()
+    with conn:
+        conn.execute("DELETE FROM failures")
+        conn.execute("DELETE FROM rollups")
+        conn.execute("DELETE FROM rollup_errors")
+        conn.execute("DELETE FROM rollup_hours")
+        conn.execute("DELETE FROM rollup_keywords")
+        conn.execute("DELETE FROM compacted_runs")
+        rotate_store_id(conn)
+    clear_logs()
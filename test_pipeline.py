@@ -1,9 +1,18 @@
+import io
 import json
+import os
+import subprocess
+import sys
 import time
+import zipfile
+import ingestion
+import log_store
+import storage
 from ingestion import ingest_ci_failure
 from knowledge_graph import build_graph, save_graph
 from embeddings import create_document_embeddings
-from graph_rag import graph_rag_pipeline, query_knowledge_graph
+from graph_rag import MAX_LINE_CHARS, estimate_tokens, graph_rag_pipeline, pack_lines, query_knowledge_graph
+from storage import clear_failures, insert_failures
 
 def test_sample_data():
     sample_failures = [
@@ -35,12 +44,127 @@ def test_sample_data():
         }
     ]
     
-    import os
-    os.makedirs("data", exist_ok=True)
+    clear_failures()
+    insert_failures(sample_failures)
+
+SHARD_SCRIPT = """
+import json
+from benchmarks.corpus import RUN_ID_BASE, write_corpus
+from embeddings import search_index_batch
+from graph_rag import analyze_failure
+from knowledge_graph import graph_context_many
+
+write_corpus(400)
+run_ids = [RUN_ID_BASE + i for i in range(0, 400, 20)]
+graph = {str(run_id): context["graph_similar"] for run_id, context in graph_context_many(run_ids, 5).items()}
+hits = [[(hit["doc_id"], round(hit["similarity"], 5)) for hit in query]
+        for query in search_index_batch(["npm ERR! code ELIFECYCLE", "CUDA out of memory", "tests failed"], 5)]
+fused = [[(hit["run_id"], round(hit["score"], 6)) for hit in analyze_failure(run_id, "tests failed")["similar_failures"]]
+         for run_id in run_ids]
+print(json.dumps({"graph": graph, "hits": hits, "fused": fused}))
+"""
+
+COMPACTION_SCRIPT = """
+import json
+from datetime import datetime
+import retention
+from benchmarks.corpus import write_corpus
+from failure_stats import get_stats
+
+write_corpus(600)
+before = get_stats()
+retention.RETENTION_DAYS = 180
+compacted = retention.compact_store(now=datetime(2024, 12, 31))
+print(json.dumps({"compacted": compacted["compacted"], "before": before, "after": get_stats()}))
+"""
+
+def run_script(workdir, script, **env):
+    (workdir / "data").mkdir(parents=True)
+    env = {**os.environ, **env, "PYTHONPATH": os.path.dirname(os.path.abspath(__file__))}
+    result = subprocess.run([sys.executable, "-c", script], cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+def test_shard_merge_matches_single_shard(tmp_path):
+    single = run_script(tmp_path / "shards_1", SHARD_SCRIPT, DEVO_SHARDS="1")
+    sharded = run_script(tmp_path / "shards_4", SHARD_SCRIPT, DEVO_SHARDS="4")
+    assert single["graph"] == sharded["graph"]
+    assert single["hits"] == sharded["hits"]
+    assert single["fused"] == sharded["fused"]
+
+def test_stats_unchanged_by_compaction(tmp_path):
+    result = run_script(tmp_path, COMPACTION_SCRIPT)
+    assert 0 < result["compacted"] < 600
+    assert result["before"]["timeline"]["hourly"]
+    assert result["before"] == result["after"]
+
+def test_log_ranges_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_store, "LOG_DB_PATH", str(tmp_path / "logs.db"))
+    monkeypatch.setattr(log_store, "CHUNK_MIN_LINES", 4)
+    monkeypatch.setattr(log_store, "CHUNK_BOUNDARY_MASK", 0x3)
+    lines = [
+        f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}.{i:03d}Z step {i} ok" if i % 3 else f"plain line {i}"
+        for i in range(300)
+    ]
+    log_store.store_log_text("test/repo1", 1, "\n".join(lines))
     
-    with open("data/failures.json", "w") as f:
-        for failure in sample_failures:
-            f.write(json.dumps(failure) + "\n")
+    chunks = log_store.connect().execute("SELECT first_line, lines FROM log_chunks WHERE run_id = 1 ORDER BY seq").fetchall()
+    assert len(chunks) > 5
+    assert log_store.log_info("test/repo1", 1) == {"lines": 300, "size": sum(len(line) + 1 for line in lines)}
+    assert log_store.read_log_lines("test/repo1", 1) == lines
+    
+    boundary = chunks[2][0]
+    ranges = [(boundary - 3, boundary + 3), (boundary - 1, boundary + 1), (-5, None), (250, 240)]
+    expected = sorted({line_no: lines[line_no] for line_no in [*range(boundary - 3, boundary + 3), *range(295, 300)]}.items())
+    assert log_store.read_log_ranges("test/repo1", 1, ranges) == expected
+    assert log_store.read_log_lines("test/repo1", 1, chunks[1][0], chunks[3][0] + 1) == lines[chunks[1][0]:chunks[3][0] + 1]
+
+def test_pack_lines_budget():
+    lines = ["x" * 40, "y" * 2000, "z" * 400, "w" * 8]
+    packed, remaining = pack_lines(lines, 100)
+    assert packed == ["- " + "x" * 40, "- " + "y" * MAX_LINE_CHARS + "...", "- " + "w" * 8]
+    assert remaining == 100 - sum(estimate_tokens(line[2:]) + 1 for line in packed)
+    assert remaining >= 0
+    
+    packed, remaining = pack_lines(lines, 10)
+    assert packed == ["- " + "w" * 8]
+    assert remaining == 10 - estimate_tokens("w" * 8) - 1
+    assert pack_lines(lines, 0) == ([], 0)
+    assert pack_lines([], 50) == ([], 50)
+
+class FakeResponse:
+    def __init__(self, body):
+        self.status_code = 200
+        self.body = body
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), 7):
+            yield self.body[i:i + 7]
+
+def test_ingest_zipped_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DB_PATH", str(tmp_path / "devo.db"))
+    monkeypatch.setattr(log_store, "LOG_DB_PATH", str(tmp_path / "logs.db"))
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("build/1_setup.txt", "2024-01-01T00:00:00.000Z Setting up\r\n2024-01-01T00:00:01.000Z npm ERR! code ELIFECYCLE\r\n")
+        zf.writestr("test/2_run.txt", "Running tests\nTests failed with 3 errors\n")
+    monkeypatch.setattr(ingestion.requests, "get", lambda *args, **kwargs: FakeResponse(archive.getvalue()))
+    
+    with ingestion.fetch_github_logs("test/zipped", 777, "token") as logs:
+        record = ingestion.build_failure_record("test/zipped", 777, {"name": "CI"}, logs)
+    
+    assert [(p["keyword"], p["line_no"]) for p in record["error_patterns"]] == [("npm err", 1), ("error", 3), ("failed", 3)]
+    assert log_store.read_log_lines("test/zipped", 777) == [
+        "2024-01-01T00:00:00.000Z Setting up",
+        "2024-01-01T00:00:01.000Z npm ERR! code ELIFECYCLE",
+        "Running tests",
+        "Tests failed with 3 errors"
+    ]
 
 def test_pipeline():
     print("1. Creating sample data...")
@@ -0,0 +1,73 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from metrics import timer
+from shards import SHARD_COUNT
+
+CPU_WORKERS = int(os.getenv("DEVO_CPU_WORKERS", min(4, os.cpu_count() or 1)))
+IO_WORKERS = int(os.getenv("DEVO_IO_WORKERS", 16))
+
+_pools = {"cpu": None, "io": None, "shards": None}
+
+def warm_worker():
+    import knowledge_graph
+
+def warm_shard(shard):
+    from embeddings import get_index
+    from knowledge_graph import get_graph
+    get_index(shard)
+    get_graph(shard)
+
+def save_shard(shard):
+    from embeddings import save_index
+    from knowledge_graph import get_graph, graph_lock, save_graph
+    with graph_lock:
+        save_graph(get_graph(shard), shard)
+    return save_index(shard)
+
+def start_pools():
+    spawn = multiprocessing.get_context("spawn")
+    if _pools["cpu"] is None:
+        _pools["cpu"] = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=spawn, initializer=warm_worker)
+    if _pools["io"] is None:
+        _pools["io"] = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="devo-io")
+    if _pools["shards"] is None:
+        _pools["shards"] = [
+            ProcessPoolExecutor(max_workers=1, mp_context=spawn, initializer=warm_shard, initargs=(shard,))
+            for shard in range(SHARD_COUNT)
+        ]
+
+def stop_pools():
+    for name, pool in _pools.items():
+        for executor in pool if isinstance(pool, list) else [pool]:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        _pools[name] = None
+
+async def run_cpu(fn, *args):
+    with timer("devo_worker_task_duration_seconds", pool="cpu", task=fn.__name__):
+        if _pools["cpu"] is None:
+            return await asyncio.to_thread(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(_pools["cpu"], fn, *args)
+
+async def run_io(fn, *args):
+    with timer("devo_worker_task_duration_seconds", pool="io", task=fn.__name__):
+        if _pools["io"] is None:
+            return await asyncio.to_thread(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(_pools["io"], fn, *args)
+
+async def run_shard(shard, fn, *args):
+    with timer("devo_worker_task_duration_seconds", pool="shard", task=fn.__name__):
+        if _pools["shards"] is None:
+            return await asyncio.to_thread(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(_pools["shards"][shard], fn, *args)
+
+async def scatter(fn, shards, *args):
+    return await asyncio.gather(*(run_shard(shard, fn, shard, *args) for shard in shards))
+
+async def warm_shards():
+    await scatter(warm_shard, range(SHARD_COUNT))
+
+async def save_shards():
+    return sum(await scatter(save_shard, range(SHARD_COUNT)))